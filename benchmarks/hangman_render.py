@@ -0,0 +1,107 @@
+"""Per-guess cost of building a hangman board, old string ladder vs hangman/board.py.
+
+    python benchmarks/hangman_render.py
+
+Doesn't need Red or discord.py, board.py is loaded straight from its file.
+The old version is word_embed's description building as it was, minus the
+discord.Embed and the currency lookup (which is now cached as well).
+"""
+
+# Standard Library
+import importlib.util
+import pathlib
+import timeit
+
+spec = importlib.util.spec_from_file_location("board", pathlib.Path(__file__).parent.parent / "hangman" / "board.py")
+board = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(board)
+
+
+def old_board(word, word_guessing, guessed_letters, mistakes, last_guess_good, won=False, winnings=0, currency=""):
+    word_output = ""
+    for i, c in enumerate(word_guessing):
+        if i != 0:
+            word_output += " "
+        word_output += c
+
+    desc = "```\n"
+    desc += "  + - - - + \n"
+    desc += "  |       | \n"
+    if mistakes >= 1:
+        desc += "  O       | \n"
+    else:
+        desc += "          | \n"
+    if mistakes >= 2:
+        if mistakes >= 3:
+            if mistakes >= 4:
+                desc += " /|\\      | \n"
+            else:
+                desc += " /|       | \n"
+        else:
+            desc += "  |       | \n"
+    else:
+        desc += "          | \n"
+    if mistakes >= 5:
+        if mistakes >= 6:
+            desc += " / \\      | \n"
+        else:
+            desc += " /        | \n"
+    else:
+        desc += "          | \n"
+    desc += "          | \n"
+    desc += " ===========\n\n"
+    desc += word_output
+    desc += "```\n"
+
+    if len(guessed_letters)>0:
+        desc += "Guessed: "
+        first = True
+        for i, letter in enumerate(guessed_letters.keys()):
+            if not first:
+                desc += ", "
+            desc += str(letter)
+            first = False
+        desc += "\n"
+    if mistakes > 0:
+        desc += str(mistakes)+"/6 mistakes\n"
+
+    colour = 0x20B2AA
+    if last_guess_good == True:
+        colour = 0xFEF000
+    if last_guess_good == False:
+        colour = 0xFF0000
+    if won == True:
+        colour = 0x00FF00
+        desc += "You won!"
+        desc += "\nYou receive "+str(winnings)+" "+currency
+
+    if mistakes == 6:
+        colour = 0x000000
+        desc = "```"
+        desc += "  /-------\\-\\\n"
+        desc += " /---------\\-\\\n"
+        desc += " |    |    | |\n"
+        desc += " |   ---   | |\n"
+        desc += " |    |    | |\n"
+        desc += " |    |    | |\n"
+        desc += " |         | |\n"
+        desc += " |   RIP   | |\n"
+        desc += "/           \\ \\\n"
+        desc += "---------------\n"
+        desc += "```\n"
+        desc += "You lose!\n"
+        desc += "The word was **"+word+"**"
+    return desc, colour
+
+
+STATES = [
+    ("black-and-white", list("b_a__-a__-_hi_e"), dict.fromkeys("bahiez"), m, good, won, 3, "credits")
+    for m in range(7) for good in (None, True, False) for won in (False, True)
+]
+
+if __name__ == "__main__":
+    for state in STATES:
+        assert old_board(*state) == board.board(*state), state
+    for fn in (old_board, board.board):
+        best = min(timeit.repeat(lambda: [fn(*state) for state in STATES], number=2000, repeat=5))
+        print(f"{fn.__name__:10} {best / (2000 * len(STATES)) * 1e6:6.2f} us per render")
@@ -0,0 +1,63 @@
+"""Times writing and reading a big ledger in both of loans/export.py's formats.
+
+    python benchmarks/ledger_files.py [rows] [out_dir]
+
+Loans are generated one at a time and streamed to the file, so this is also
+how to make a seed file of millions of loans for `[p]loan import`: pass
+out_dir and loans.csv / loans.bin are left there. Doesn't need Red,
+export.py is loaded straight from its file.
+"""
+
+# Standard Library
+import importlib.util
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+spec = importlib.util.spec_from_file_location("export", pathlib.Path(__file__).parent.parent / "loans" / "export.py")
+export = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(export)
+
+
+def make_loans(rows, seed=0):
+    rng = random.Random(seed)
+    members = max(2, rows // 5)
+    base_id = 100_000_000_000_000_000
+    for i in range(rows):
+        loaner = base_id + i % members
+        loanee = base_id + (i + 1 + rng.randrange(members - 1)) % members
+        amount = rng.randint(1, 1_000_000)
+        interest = rng.choice([5, 10]) if rng.random() < 0.2 else None
+        yield {
+            "original_amount": amount,
+            "outstanding": amount + rng.randint(0, 1000),
+            "interest": interest,
+            "loaner": str(loaner),
+            "loanee": str(loanee),
+            "interest_calc_day": 20000 + rng.randint(0, 365) if interest else None,
+        }
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp()
+    for file_format in export.FORMATS:
+        path = os.path.join(out_dir, "loans."+file_format)
+        start = time.perf_counter()
+        written = export.write(path, make_loans(rows), file_format)
+        wrote = time.perf_counter()
+        read_back = 0
+        for loan0, expected in zip(export.read(path), make_loans(rows)):
+            read_back += 1
+        finished = time.perf_counter()
+        # spot check the round trip
+        assert read_back == written == rows
+        assert loan0["outstanding"] == expected["outstanding"] and loan0["loanee"] == expected["loanee"]
+        print(f"{file_format:4} {rows} rows  write {wrote-start:6.2f} s  read {finished-wrote:6.2f} s  {os.path.getsize(path)/rows:5.1f} bytes/row")
+    if len(sys.argv) <= 2:
+        for file_format in export.FORMATS:
+            os.remove(os.path.join(out_dir, "loans."+file_format))
+        os.rmdir(out_dir)
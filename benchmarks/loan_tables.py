@@ -0,0 +1,79 @@
+"""Times building every page of a 10k row debtboard, old PrettyTable way vs loans/render.py.
+
+    python benchmarks/loan_tables.py [rows]
+
+Needs prettytable installed for the old side. Doesn't need Red, render.py is
+imported without the rest of the cog.
+"""
+
+# Standard Library
+import pathlib
+import random
+import sys
+import timeit
+import types
+from types import SimpleNamespace
+
+# Other
+import prettytable
+from prettytable import PrettyTable
+
+# an empty loans package, so render.py's relative imports work without loading the cog (and Red)
+package = types.ModuleType("loans")
+package.__path__ = [str(pathlib.Path(__file__).parent.parent / "loans")]
+sys.modules["loans"] = package
+from loans import render
+
+
+def make_loans(rows):
+    loans = []
+    for i in range(rows):
+        amount = random.randint(1, 100_000)
+        loans.append(SimpleNamespace(
+            loaner_key=str(random.randint(1, rows//4)),
+            loanee_key=str(random.randint(1, rows//4)),
+            original_amount=amount,
+            outstanding=amount + random.randint(0, 1000),
+            interest=random.choice([None, 5, 10]),
+        ))
+    names = {}
+    for loan in loans:
+        names[loan.loaner_key] = "member"+loan.loaner_key
+        names[loan.loanee_key] = "member"+loan.loanee_key
+    return loans, names
+
+
+# What debtboard did before the shared renderer
+def prettytable_pages(loans, names):
+    field_names = ["#", "Loaner", "Loanee", "Initial", "Interest", "Outstanding"]
+    base_table = PrettyTable(field_names=field_names)
+    base_table.set_style(prettytable.PLAIN_COLUMNS)
+    base_table.right_padding_width = 2
+    base_table.align = "l"
+    for name in field_names[3:]:
+        base_table.align[name] = "r"
+
+    pages = []
+    temp_table = base_table.copy()
+    for i, loan in enumerate(loans, start=1):
+        temp_table.add_row([f"{i}.", names[loan.loaner_key], names[loan.loanee_key], loan.original_amount, str(loan.interest or 0)+"%", loan.outstanding])
+        if i % render.PAGE_SIZE == 0:
+            pages.append(temp_table.get_string())
+            temp_table = base_table.copy()
+    if len(temp_table.rows):
+        pages.append(temp_table.get_string())
+    return pages
+
+
+def ledger_table_pages(loans, names):
+    table = render.LedgerTable(("loaner", "loanee"), True)
+    size = render.PAGE_SIZE
+    return [table.render(loans[i:i+size], names, start=i+1) for i in range(0, len(loans), size)]
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    loans, names = make_loans(rows)
+    for fn in (prettytable_pages, ledger_table_pages):
+        best = min(timeit.repeat(lambda: fn(loans, names), number=1, repeat=5))
+        print(f"{fn.__name__:20} {rows} rows: {best*1000:8.1f} ms")
@@ -0,0 +1,72 @@
+"""Times settling a synthetic guild ledger with loans/settle.py, and checks the result.
+
+    python benchmarks/settle_ledger.py [members] [loans]
+
+Builds a random ledger (10k members and 50k loans by default, a tenth of
+them charging interest), plans and applies a settlement, then checks that
+every member's net balance is unchanged and no interest bearing loan was
+touched. Doesn't need Red, settle.py is loaded straight from its file.
+"""
+
+# Standard Library
+import copy
+import importlib.util
+import pathlib
+import random
+import sys
+import time
+
+spec = importlib.util.spec_from_file_location("settle", pathlib.Path(__file__).parent.parent / "loans" / "settle.py")
+settle = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(settle)
+
+
+def make_ledger(members, loans):
+    ledger = {}
+    for i in range(loans):
+        loaner_key = str(random.randint(1, members))
+        loanee_key = str(random.randint(1, members))
+        if loaner_key == loanee_key:
+            continue
+        amount = random.randint(1, 100_000)
+        interest = random.choice([5, 10]) if random.random() < 0.1 else None
+        ledger.setdefault(loaner_key, {})[loanee_key] = {"original_amount": amount, "outstanding": amount, "interest": interest, "loaner": loaner_key, "loanee": loanee_key}
+    return ledger
+
+
+def net_balances(ledger):
+    net = {}
+    for loan_dict in ledger.values():
+        for loan0 in loan_dict.values():
+            net[loan0["loaner"]] = net.get(loan0["loaner"], 0) + loan0["outstanding"]
+            net[loan0["loanee"]] = net.get(loan0["loanee"], 0) - loan0["outstanding"]
+    return {key: amount for key, amount in net.items() if amount}
+
+
+def interest_loans(ledger):
+    return {(loaner_key, loanee_key): loan0 for loaner_key, loan_dict in ledger.items() for loanee_key, loan0 in loan_dict.items() if loan0["interest"]}
+
+
+def loan_count(ledger):
+    return sum(len(loan_dict) for loan_dict in ledger.values())
+
+
+if __name__ == "__main__":
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    loans = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    ledger = make_ledger(members, loans)
+    before = copy.deepcopy(ledger)
+
+    start = time.perf_counter()
+    settlement = settle.plan(ledger)
+    planned = time.perf_counter()
+    settle.apply(ledger, settlement)
+    applied = time.perf_counter()
+
+    assert net_balances(ledger) == net_balances(before), "net balances changed"
+    assert interest_loans(ledger) == interest_loans(before), "interest bearing loans changed"
+
+    print(f"{members} members, {loan_count(before)} loans ({len(interest_loans(before))} with interest)")
+    print(f"settled {len(settlement.replaced)} interest free loans into {len(settlement.transfers)}, {loan_count(ledger)} loans left")
+    print(f"plan  {(planned-start)*1000:8.1f} ms")
+    print(f"apply {(applied-planned)*1000:8.1f} ms")
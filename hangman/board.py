@@ -0,0 +1,98 @@
+# Standard Library
+import time
+
+_TOP    = "```\n  + - - - + \n  |       | \n"
+_BOTTOM = "          | \n ===========\n\n"
+
+_HEAD  = ("          | \n", "  O       | \n")
+_BODY  = ("          | \n", "          | \n", "  |       | \n", " /|       | \n", " /|\\      | \n")
+_LEGS  = ("          | \n", " /        | \n", " / \\      | \n")
+
+# The gallows after 0-6 mistakes, worked out once
+GALLOWS = tuple(
+    _TOP + _HEAD[min(1, m)] + _BODY[min(4, m)] + _LEGS[max(0, min(2, m-4))] + _BOTTOM
+    for m in range(7)
+)
+
+RIP = (
+    "```"
+    "  /-------\\-\\\n"
+    " /---------\\-\\\n"
+    " |    |    | |\n"
+    " |   ---   | |\n"
+    " |    |    | |\n"
+    " |    |    | |\n"
+    " |         | |\n"
+    " |   RIP   | |\n"
+    "/           \\ \\\n"
+    "---------------\n"
+    "```\n"
+    "You lose!\n"
+    "The word was **{word}**"
+)
+
+MAX_MISTAKES = 6
+
+COLOUR_START = 0x20B2AA
+COLOUR_GOOD  = 0xFEF000
+COLOUR_BAD   = 0xFF0000
+COLOUR_WON   = 0x00FF00
+COLOUR_LOST  = 0x000000
+
+
+def board(word, word_guessing, guessed_letters, mistakes, last_guess_good, won=False, winnings=0, currency="", shares=None):
+    """The description and colour of a game's embed.
+
+    `shares` is a list of (name, amount) for shared games, in place of `winnings`.
+    """
+    if mistakes >= MAX_MISTAKES:
+        return RIP.format(word=word), COLOUR_LOST
+
+    parts = [GALLOWS[mistakes], " ".join(word_guessing), "```\n"]
+    if guessed_letters:
+        parts.append("Guessed: "+", ".join(guessed_letters)+"\n")
+    if mistakes > 0:
+        parts.append(str(mistakes)+"/6 mistakes\n")
+
+    colour = COLOUR_START
+    if last_guess_good == True:
+        colour = COLOUR_GOOD
+    if last_guess_good == False:
+        colour = COLOUR_BAD
+    if won:
+        colour = COLOUR_WON
+        if shares is not None:
+            parts.append("Solved!")
+            parts.extend("\n"+name+" receives "+str(amount)+" "+currency for name, amount in shares)
+        else:
+            parts.append("You won!\nYou receive "+str(winnings)+" "+currency)
+    return "".join(parts), colour
+
+
+class CurrencyNames:
+    """Per-guild cache of the bank's currency name.
+
+    `fetch` is bank.get_currency_name. Names are kept for `ttl` seconds, and
+    the cog drops a guild's name early when someone renames the currency.
+    """
+
+    def __init__(self, fetch, ttl=600):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._names = {}
+
+    async def get(self, guild):
+        key = guild.id if guild is not None else None
+        cached = self._names.get(key)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+        name = str(await self.fetch(guild))
+        self._names[key] = (name, time.monotonic())
+        return name
+
+    def invalidate(self, guild=None):
+        """Forget one guild's name, or every name if guild is None (global banks)."""
+        if guild is None:
+            self._names.clear()
+        else:
+            self._names.pop(guild.id, None)
@@ -0,0 +1,122 @@
+# Standard Library
+import asyncio
+import math
+
+# What a waiting game gets back when the cog is unloaded
+CLOSED = object()
+
+
+class TimerWheel:
+    """Coarse timeouts for lots of waiters, all run off one background task.
+
+    Callbacks are bucketed into `slots` slots of `tick` seconds each; every
+    tick only the current slot is looked at, so scheduling and cancelling
+    are O(1) and the cost per tick doesn't grow with the number of games.
+    """
+
+    def __init__(self, tick=1.0, slots=64):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]
+        self.position = 0
+        self._task = None
+        self._next_id = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def schedule(self, delay, callback):
+        """Calls `callback()` after roughly `delay` seconds, returns a handle for cancel()."""
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self.position + ticks) % len(self.slots)
+        rounds = (ticks - 1) // len(self.slots)
+        self._next_id += 1
+        self.slots[slot][self._next_id] = [rounds, callback]
+        return (slot, self._next_id)
+
+    def cancel(self, handle):
+        slot, timer_id = handle
+        self.slots[slot].pop(timer_id, None)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.position = (self.position + 1) % len(self.slots)
+            slot = self.slots[self.position]
+            for timer_id, timer in list(slot.items()):
+                if timer[0] > 0:
+                    timer[0] -= 1
+                    continue
+                del slot[timer_id]
+                timer[1]()
+
+
+class GuessRouter:
+    """Routes messages to the game waiting on them.
+
+    Games are keyed by (channel id, author id), or (channel id, None) for a
+    game anyone in the channel can play. The cog hands every message to
+    `route()`, which is at most two dict lookups, instead of each game
+    running its own wait_for check against every message the bot sees.
+    """
+
+    def __init__(self, wheel):
+        self.wheel = wheel
+        self.sessions = {}
+        self.closed = False
+        self._waiting = {}
+
+    def register(self, key, session):
+        """Returns False if there's already a game under this key."""
+        if key in self.sessions:
+            return False
+        self.sessions[key] = session
+        return True
+
+    def unregister(self, key, result=None):
+        self.sessions.pop(key, None)
+        waiter = self._waiting.pop(key, None)
+        if waiter is not None:
+            self.wheel.cancel(waiter[2])
+            if not waiter[0].done():
+                waiter[0].set_result(result)
+
+    async def wait(self, key, check, timeout):
+        """The next message under `key` that passes `check`, or None after `timeout` seconds."""
+        if self.closed:
+            return CLOSED
+        future = asyncio.get_running_loop().create_future()
+
+        def expire():
+            if self._waiting.get(key, (None,))[0] is future:
+                del self._waiting[key]
+            if not future.done():
+                future.set_result(None)
+
+        self._waiting[key] = (future, check, self.wheel.schedule(timeout, expire))
+        return await future
+
+    def route(self, message):
+        if message.author.bot:
+            return False
+        key = (message.channel.id, message.author.id)
+        waiter = self._waiting.get(key)
+        if waiter is None:
+            key = (message.channel.id, None)
+            waiter = self._waiting.get(key)
+        if waiter is None or waiter[0].done() or not waiter[1](message):
+            return False
+        del self._waiting[key]
+        self.wheel.cancel(waiter[2])
+        waiter[0].set_result(message)
+        return True
+
+    def close(self):
+        self.closed = True
+        for key in list(self.sessions):
+            self.unregister(key, CLOSED)
@@ -1,11 +1,384 @@
+# Standard Library
+import asyncio
+import logging
+import re
+import typing
+from math import ceil
+
+# Red
+from redbot.core import bank
 from redbot.core import commands
+from redbot.core import Config
+from redbot.core.data_manager import bundled_data_path
+from redbot.core.data_manager import cog_data_path
+from redbot.core.utils.chat_formatting import box
+from redbot.core.utils.menus import close_menu, menu, DEFAULT_CONTROLS
+
+# Discord
+import discord
+
+# Local
+from .board import CurrencyNames
+from .dispatch import GuessRouter
+from .dispatch import TimerWheel
+from .hangsesh import DEFAULT_GUESS_PREFIX
 from .hangsesh import HangmanSession
+from .payouts import PayoutQueue
+from .scoring import load_history
+from .scoring import score_words
+from .scoring import write_scores
+from .stats import StatsStore
+from .updates import BoardUpdater
+from .wordpack import build_index
+from .wordpack import WordPack
+from .words import DIFFICULTIES
+from .words import WordCorpus
+
+log = logging.getLogger("red.remcogs.hangman")
+
+# Pack names become file names, so nothing that could climb out of the packs folder
+PACK_NAME = re.compile(r"[a-z0-9_-]+")
 
 class Hangman(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.config = Config.get_conf(self, identifier=15)
+        self.config.register_guild(pack=None, guess_prefix=DEFAULT_GUESS_PREFIX, stats={}, difficulty=None)
+        self.config.register_global(sessions={})
+        words_path = bundled_data_path(self) / "words.txt"
+        self.words = WordCorpus(words_path, [cog_data_path(self) / "words.txt.scores", str(words_path)+".scores"])
+        self.packs = {}
+        self.timers = TimerWheel()
+        self.timers.start()
+        self.guesses = GuessRouter(self.timers)
+        self.currency = CurrencyNames(bank.get_currency_name)
+        self.updates = BoardUpdater()
+        self.payouts = PayoutQueue()
+        self.payouts.start()
+        self.stats = StatsStore(self.config, cog_data_path(self) / "results.jsonl")
+        self.stats.start()
+        self.saved_sessions = {}
+        self.sessions_dirty = False
+        self.checkpoint_task = asyncio.create_task(self.checkpoint_loop())
+        self.resume_task = asyncio.create_task(self.resume_sessions())
+
+    def cog_unload(self):
+        self.resume_task.cancel()
+        self.checkpoint_task.cancel()
+        self.guesses.close()
+        self.timers.stop()
+        self.updates.close()
+        self.payouts.stop()
+        asyncio.create_task(self.payouts.flush())
+        self.stats.stop()
+        asyncio.create_task(self.stats.flush())
+        asyncio.create_task(self.save_sessions())
+        for pack in self.packs.values():
+            pack.close()
+        self.packs.clear()
+
+    @property
+    def packs_path(self):
+        path = cog_data_path(self) / "packs"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    # Where a pack's wordlist lives, None if the name isn't allowed
+    def pack_path(self, name):
+        if not PACK_NAME.fullmatch(name):
+            return None
+        return self.packs_path / (name+".txt")
+
+    # The guild's active word pack, or the bundled wordlist
+    async def word_source(self, guild):
+        if guild is None:
+            return self.words
+        name = await self.config.guild(guild).pack()
+        if name is None:
+            return self.words
+        pack = self.packs.get(name)
+        if pack is None:
+            path = self.pack_path(name)
+            if path is None or not path.exists() or WordPack.is_stale(path):
+                return self.words
+            pack = self.packs[name] = WordPack(path)
+        return pack
+
+    # Games in progress are saved in batches, every few seconds at most
+    def checkpoint(self, session):
+        self.saved_sessions["{}-{}".format(*session.key)] = session.to_dict()
+        self.sessions_dirty = True
+
+    def forget(self, session):
+        if self.saved_sessions.pop("{}-{}".format(*session.key), None) is not None:
+            self.sessions_dirty = True
+
+    async def save_sessions(self):
+        if not self.sessions_dirty:
+            return
+        self.sessions_dirty = False
+        try:
+            await self.config.sessions.set(dict(self.saved_sessions))
+        except BaseException:
+            # still needs saving
+            self.sessions_dirty = True
+            raise
+
+    async def checkpoint_loop(self, interval=5):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.save_sessions()
+            except Exception:
+                log.exception("Saving running hangman games failed")
+
+    # Picks up the games that were running when the cog was last unloaded
+    async def resume_sessions(self):
+        await self.bot.wait_until_ready()
+        for name, data in (await self.config.sessions()).items():
+            channel = self.bot.get_channel(data["channel"])
+            author = None
+            if channel is not None:
+                guild = getattr(channel, "guild", None)
+                author = guild.get_member(data["author"]) if guild is not None else self.bot.get_user(data["author"])
+            if author is None:
+                self.sessions_dirty = True
+                continue
+
+            session = HangmanSession.from_dict(self, channel, author, data)
+            if data.get("message") is not None:
+                try:
+                    session.message = await channel.fetch_message(data["message"])
+                except discord.HTTPException:
+                    pass
+            self.saved_sessions[name] = data
+            asyncio.create_task(self.run_session(session, resume=True))
+
+    async def run_session(self, session, resume=False):
+        if not self.guesses.register(session.key, session):
+            return
+        try:
+            if resume:
+                await session.hangman_loop()
+            else:
+                await session.play()
+        finally:
+            self.guesses.unregister(session.key)
+
+    async def start_session(self, ctx, difficulty, shared):
+        if difficulty is not None:
+            difficulty = difficulty.lower()
+            if difficulty not in DIFFICULTIES:
+                await ctx.send("Difficulty must be one of: "+", ".join(DIFFICULTIES))
+                return
+        elif ctx.guild is not None:
+            difficulty = await self.config.guild(ctx.guild).difficulty()
+        session = HangmanSession(self, ctx.channel, ctx.author, difficulty, shared)
+        if session.key in self.guesses.sessions:
+            if shared:
+                await ctx.send("There's already a game going for the whole channel!")
+            else:
+                await ctx.send(ctx.author.mention+" you're already playing here!")
+            return
+        await self.run_session(session)
+
+    @commands.group(invoke_without_command=True)
+    async def hangman(self, ctx, difficulty: typing.Optional[str]):
+        """Guess the word before the stickman hangs!
+
+        Guess a letter by sending it on its own, or the whole word with `guess yourword`.
+
+        Examples:
+            - `[p]hangman` - Any word.
+            - `[p]hangman hard` - A word from easy, medium or hard.
+            - `[p]hangman channel` - A game anyone in the channel can join in on.
+        """
+
+        await self.start_session(ctx, difficulty, False)
+
+    @commands.guild_only()
+    @hangman.command(name="channel")
+    async def hangman_channel(self, ctx, difficulty: typing.Optional[str]):
+        """A game for the whole channel, anyone can guess.
+
+        Everyone who reveals letters gets a share of the winnings, split by how many they found.
+        """
+
+        await self.start_session(ctx, difficulty, True)
+
+    @commands.guild_only()
+    @hangman.command(name="leaderboard", aliases=["lb"])
+    async def hangman_leaderboard(self, ctx, sort: typing.Optional[str] = "wins"):
+        """The best hangman players in the server.
+
+        Examples:
+            - `[p]hangman leaderboard` - Most wins first.
+            - `[p]hangman leaderboard winnings` - Sorted by wins, games or winnings.
+        """
+
+        sort = sort.lower()
+        if sort not in ("wins", "games", "winnings"):
+            await ctx.send("Sort by one of: wins, games, winnings")
+            return
+        stats = await self.stats.get(ctx.guild)
+        totals = stats["totals"]
+        if totals["games"] == 0:
+            await ctx.send("Nobody's played hangman here yet!")
+            return
+
+        games = totals["games"]
+        summary = (
+            str(games)+" games, "+str(round(100*totals["wins"]/games))+"% won, "
+            +str(round(totals["mistakes"]/games, 1))+" mistakes and "
+            +str(round(totals["duration"]/games))+"s on average, "
+            +str(totals["winnings"])+" "+await self.currency.get(ctx.guild)+" paid out"
+        )
+        players = await self.stats.leaderboard(ctx.guild, sort)
+        page_count = ceil(len(players)/10)
+        pages = []
+        for page in range(page_count):
+            lines = []
+            for i, (user_id, player) in enumerate(players[page*10:(page+1)*10], start=page*10+1):
+                member = ctx.guild.get_member(user_id)
+                name = member.display_name if member is not None else "Unknown"
+                lines.append(f"{i}. {name} - {player['wins']}/{player['games']} won, {player['winnings']} earned")
+            pages.append(summary+"\n"+box("\n".join(lines), lang="md")+f"Page {page+1}/{page_count}")
+
+        await menu(
+            ctx,
+            pages,
+            DEFAULT_CONTROLS if len(pages) > 1 else {"\N{CROSS MARK}": close_menu},
+        )
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        self.guesses.route(message)
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx):
+        if ctx.command.qualified_name == "bankset creditsname":
+            self.currency.invalidate(None if await bank.is_global() else ctx.guild)
+
+    @commands.group()
+    async def hangmanset(self, ctx):
+        """Hangman settings."""
+        pass
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    @hangmanset.command()
+    async def prefix(self, ctx, prefix: typing.Optional[str]):
+        """What to type before guessing a whole word, e.g. `guess yourword`.
+
+        Leave it out to go back to `guess`.
+        """
+
+        prefix = (prefix or DEFAULT_GUESS_PREFIX).lower()
+        await self.config.guild(ctx.guild).guess_prefix.set(prefix)
+        await ctx.send("Guess whole words with `"+prefix+" yourword`")
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    @hangmanset.command()
+    async def difficulty(self, ctx, difficulty: typing.Optional[str]):
+        """How hard words are when nobody asks for a difficulty.
+
+        One of easy, medium or hard, leave it out to pick from every word.
+        """
+
+        if difficulty is not None:
+            difficulty = difficulty.lower()
+            if difficulty not in DIFFICULTIES:
+                await ctx.send("Difficulty must be one of: "+", ".join(DIFFICULTIES))
+                return
+        await self.config.guild(ctx.guild).difficulty.set(difficulty)
+        await ctx.send("Games here now use "+(difficulty or "any")+" words by default.")
+
+    @commands.is_owner()
+    @hangmanset.command()
+    async def rescore(self, ctx):
+        """Score the default wordlist's difficulty again, taking in how often each word has been solved."""
+
+        def rescore():
+            with open(self.words.path) as f:
+                words = [line.strip() for line in f if line.strip()]
+            history = load_history(self.stats.log_path)
+            write_scores(cog_data_path(self) / "words.txt.scores", score_words(words, history))
+            return len(words), len(history)
+
+        word_count, played = await ctx.bot.loop.run_in_executor(None, rescore)
+        await ctx.send("Scored "+str(word_count)+" words, "+str(played)+" of them with history.")
+
+    @commands.is_owner()
+    @hangmanset.command()
+    async def apistats(self, ctx):
+        """How many Discord API calls hangman has saved by batching its updates."""
+
+        u = self.updates
+        await ctx.send(
+            "Board edits: "+str(u.edits_requested)+" asked for, "+str(u.edits_sent)+" sent, "+str(u.edits_saved)+" saved\n"
+            "Guess deletes: "+str(u.deletes_requested)+" asked for, "+str(u.delete_calls)+" API calls, "+str(u.delete_calls_saved)+" saved"
+        )
+
+    @hangmanset.group()
+    async def pack(self, ctx):
+        """Word packs, extra wordlists a server can play with instead of the default one."""
+        pass
+
+    @pack.command(name="list")
+    async def pack_list(self, ctx):
+        """List the installed word packs."""
+
+        names = sorted(path.stem for path in self.packs_path.glob("*.txt"))
+        if len(names)==0:
+            await ctx.send("No word packs installed!")
+            return
+        await ctx.send("Word packs: "+", ".join(names))
+
+    @commands.is_owner()
+    @pack.command(name="build")
+    async def pack_build(self, ctx, name: str):
+        """Install a word pack, or re-index one.
+
+        Attach a plain text file with one word per line to install it as 'name'.
+        Without an attachment, the existing 'name' pack is indexed again.
+        """
+
+        name = name.lower()
+        path = self.pack_path(name)
+        if path is None:
+            await ctx.send("Pack names can only use letters, numbers, - and _")
+            return
+        if ctx.message.attachments:
+            await ctx.message.attachments[0].save(path)
+        elif not path.exists():
+            await ctx.send("There's no "+name+" pack, attach a wordlist to install one.")
+            return
+
+        old = self.packs.pop(name, None)
+        if old is not None:
+            old.close()
+        count = await ctx.bot.loop.run_in_executor(None, build_index, path)
+        await ctx.send("Indexed "+str(count)+" words for the "+name+" pack.")
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    @pack.command(name="use")
+    async def pack_use(self, ctx, name: str):
+        """Choose the word pack this server plays with, `default` for the normal wordlist."""
 
-    @commands.command()
-    async def hangman(self, ctx):
-        await HangmanSession().play(ctx)
\ No newline at end of file
+        name = name.lower()
+        if name == "default":
+            await self.config.guild(ctx.guild).pack.set(None)
+            await ctx.send("Using the default wordlist.")
+            return
+        path = self.pack_path(name)
+        if path is None or not path.exists():
+            await ctx.send("There's no "+name+" pack!")
+            return
+        if WordPack.is_stale(path):
+            await ctx.send("The "+name+" pack needs building first.")
+            return
+        await self.config.guild(ctx.guild).pack.set(name)
+        await ctx.send("Now using the "+name+" pack.")
@@ -1,196 +1,251 @@
 # Standard Library
-import asyncio
 import random
-import csv
-
-# Red
-from redbot.core import bank
-from redbot.core.i18n import Translator
-from redbot.core.errors import BalanceTooHigh
-from redbot.core.utils.chat_formatting import box
-from redbot.core.utils.predicates import MessagePredicate
-from redbot.core.data_manager import bundled_data_path
+import time
 
 # Discord
 import discord
 
-##TODO:
-## - ability to guess the word by typing "guess YOURWORD" (not just word as you may want to talk while playing)
+# Local
+from .board import board
+from .dispatch import CLOSED
+from .stats import LOSS
+from .stats import TIMEOUT
+from .stats import WIN
+
+DEFAULT_GUESS_PREFIX = "guess"
+
+
+# Case, hyphens and spaces don't matter when guessing the whole word
+def normalise(word):
+    return "".join(word.lower().replace("-", " ").split())
+
 
 class HangmanSession:
-    async def play(self, ctx):
-        self.datapath = bundled_data_path(self)
+    """One game of hangman.
+
+    The board is a reveal buffer (one char per letter of the word) plus a map
+    of letter -> positions, so a guess only touches the positions it reveals.
+    Everything needed to carry on a game is in to_dict()/from_dict(), which
+    the cog checkpoints after every guess so games survive a reload.
+    """
+
+    __slots__ = ("cog", "difficulty", "channel", "author", "shared", "contributions", "prefix", "started", "message", "word", "positions", "reveal", "hidden", "mistakes", "last_guess_good", "guessed_letters")
+
+    # shared games take guesses from anyone in the channel, author is whoever started it
+    def __init__(self, cog, channel, author, difficulty=None, shared=False):
+        self.cog = cog
+        self.channel = channel
+        self.author = author
+        self.shared = shared
+        self.contributions = {}
+        self.prefix = DEFAULT_GUESS_PREFIX
+        self.started = int(time.time())
+        self.message = None
+        self.difficulty = difficulty
+        self.word = None
         self.mistakes = 0
         self.last_guess_good = None
         self.guessed_letters = {}
-        await self.pick_word(ctx)
-        await self.hangman_loop(ctx)
+
+    @property
+    def key(self):
+        return (self.channel.id, None if self.shared else self.author.id)
+
+    @property
+    def guild(self):
+        return getattr(self.channel, "guild", None)
+
+    async def play(self):
+        if await self.pick_word() is None:
+            return
+        await self.hangman_loop()
     
-    async def pick_word(self, ctx):
+    async def pick_word(self):
         try:
-            with open(self.datapath / "words.txt") as f:
-                wordlist = f.read().splitlines()
+            word = (await self.cog.word_source(self.guild)).pick(self.difficulty)
         except FileNotFoundError:
-            await ctx.send("No wordlist??")
+            word = None
+        if word is None:
+            await self.channel.send("No wordlist??")
             return None
         
-        self.word = random.choice(wordlist)        
-        print(self.word)
-        self.word_guessing = ""
-        for i,c in enumerate(self.word):
-            if c == "-":
-                self.word_guessing += "-"
-            elif c == " ":
-                self.word_guessing += " "
+        self.set_word(word)
+        return self.word
+
+    def set_word(self, word):
+        self.word = word
+        self.positions = {}
+        self.reveal = []
+        self.hidden = 0
+        for i, c in enumerate(word):
+            if c == "-" or c == " ":
+                self.reveal.append(c)
             else:
-                self.word_guessing += "_"
-
-    async def hangman_loop(self, ctx, message=None):
-        embed = await self.word_embed(ctx)
-        if message is not None:
-            await message.edit(content=ctx.author.mention, embed=embed)
-        else: 
-            message = await ctx.send(ctx.author.mention, embed=embed)
-        guess = await self.get_guess(ctx)
-        if guess == None:
-            await ctx.send(ctx.author.mention+" time's up! the word was **"+self.word+"**")
-            return
-        else:
-            await self.guess(ctx, guess)
-            if self.check_loss():
-                await message.edit(embed=await self.word_embed(ctx, False))
+                self.reveal.append("_")
+                self.positions.setdefault(c, []).append(i)
+                self.hidden += 1
+
+    @property
+    def word_guessing(self):
+        return "".join(self.reveal)
+
+    def to_dict(self):
+        return {
+            "channel": self.channel.id,
+            "author": self.author.id,
+            "message": self.message.id if self.message is not None else None,
+            "word": self.word,
+            "guessed": "".join(self.guessed_letters),
+            "mistakes": self.mistakes,
+            "last_guess_good": self.last_guess_good,
+            "difficulty": self.difficulty,
+            "shared": self.shared,
+            "contributions": {str(k): v for k, v in self.contributions.items()},
+            "started": self.started,
+        }
+
+    @classmethod
+    def from_dict(cls, cog, channel, author, data):
+        session = cls(cog, channel, author, data.get("difficulty"), data.get("shared", False))
+        session.contributions = {int(k): v for k, v in data.get("contributions", {}).items()}
+        session.started = data.get("started", session.started)
+        session.set_word(data["word"])
+        for g in data["guessed"]:
+            session.reveal_letter(g)
+            session.guessed_letters[g] = True
+        session.mistakes = data["mistakes"]
+        session.last_guess_good = data["last_guess_good"]
+        return session
+
+    async def hangman_loop(self):
+        updates = self.cog.updates
+        mention = "Anyone can guess!" if self.shared else self.author.mention
+        if self.guild is not None:
+            self.prefix = (await self.cog.config.guild(self.guild).guess_prefix()).lower()
+        while True:
+            embed = await self.word_embed()
+            if self.message is not None:
+                await updates.edit(self.message, content=mention, embed=embed)
+            else: 
+                self.message = await self.channel.send(mention, embed=embed)
+            self.cog.checkpoint(self)
+
+            msg = await self.get_guess()
+            if msg is CLOSED:
                 return
-            if self.check_win():
-                winnings = random.randint(1,5)
-                await message.edit(embed=await self.word_embed(ctx, True, winnings))
-                try:
-                    await bank.deposit_credits(ctx.author, winnings)           
-                except BalanceTooHigh as e:
-                    await bank.set_balance(ctx.author, e.max_balance)
+            if msg == None:
+                await self.finish(TIMEOUT)
+                await updates.flush(self.message)
+                whom = "" if self.shared else self.author.mention+" "
+                await self.channel.send(whom+"time's up! the word was **"+self.word+"**")
                 return
-            else:
-                await self.hangman_loop(ctx, message)
-    
-    async def word_embed(self, ctx, won=False, winnings=0):
-        word_output = ""
-        
-        for i, c in enumerate(self.word_guessing):
-            if i != 0:
-                word_output += " "
-                
-            word_output += c
             
-        desc = "```\n"       
-        
-        desc += "  + - - - + \n"
-        desc += "  |       | \n"
-        
-        #victim, code is bad cos lazy    
-        if self.mistakes >= 1:
-            desc += "  O       | \n"
-        else:
-            desc += "          | \n"
-        
-        if self.mistakes >= 2:
-            if self.mistakes >= 3:
-                if self.mistakes >= 4:
-                    desc += " /|\      | \n"
-                else:
-                    desc += " /|       | \n"                
+            content = msg.content.lower()
+            if len(content)==1 and content.isalpha():
+                await self.guess(content, msg.author)
             else:
-                desc += "  |       | \n"
-        else:
-            desc += "          | \n"       
-        if self.mistakes >= 5:
-            if self.mistakes >= 6:
-                desc += " / \\      | \n"
-            else:
-                desc += " /        | \n"
-        else:
-            desc += "          | \n"
-
-        desc += "          | \n"        
-        desc += " ===========\n\n"
+                self.guess_word(content[len(self.prefix):], msg.author)
+            if self.check_loss():
+                await self.finish(LOSS)
+                await updates.edit(self.message, embed=await self.word_embed(False))
+                await updates.flush(self.message)
+                return
+            if self.check_win():
+                payouts = self.payouts(random.randint(1,5))
+                await self.finish(WIN, payouts)
+                await updates.edit(self.message, embed=await self.word_embed(True, payouts))
+                await updates.flush(self.message)
+                for member, amount in payouts:
+                    self.cog.payouts.add(member, amount)
+                return
 
-        desc += word_output
-        desc += "```\n"
-        
-        if len(self.guessed_letters)>0:
-            desc += "Guessed: "
-            first = True
-            for i, letter in enumerate(self.guessed_letters.keys()):
-                if not first:
-                    desc += ", "
-                desc += str(letter)
-                first = False
-            desc += "\n"          
-            
-        if self.mistakes > 0:
-            desc += str(self.mistakes)+"/6 mistakes\n"
-
-        colour = 0x20B2AA
-        if self.last_guess_good == True:
-            colour = 0xFEF000
-        if self.last_guess_good == False:
-            colour = 0xFF0000      
-        if won == True:
-            colour = 0x00FF00
-            desc += "You won!"
-            desc += "\nYou receive "+str(winnings)+" "+str(await bank.get_currency_name(ctx.guild))
-            
-        if self.mistakes == 6:
-            colour = 0x000000
-            desc = "```"
-            desc += "  /-------\\-\\\n"
-            desc += " /---------\\-\\\n"
-            desc += " |    |    | |\n"
-            desc += " |   ---   | |\n"
-            desc += " |    |    | |\n"
-            desc += " |    |    | |\n"
-            desc += " |         | |\n"
-            desc += " |   RIP   | |\n"
-            desc += "/           \ \\\n"
-            desc += "---------------\n"
-            desc += "```\n"
-            desc += "You lose!\n"
-            desc += "The word was **"+self.word+"**"
-        
+    # Drops the checkpoint and records the result
+    async def finish(self, outcome, payouts=()):
+        self.cog.forget(self)
+        paid = {member.id: amount for member, amount in payouts}
+        player_ids = [self.author.id]
+        if self.shared and self.contributions:
+            player_ids = list(self.contributions)
+        players = [(user_id, paid.get(user_id, 0)) for user_id in player_ids]
+        await self.cog.stats.record(self.guild, self.word, outcome, self.mistakes, int(time.time()) - self.started, players)
 
-        embed = discord.Embed(description=desc, colour=colour)
-        return embed
-        
+    # Who gets what, shared games give each player a roll and split the pot by letters revealed
+    def payouts(self, roll):
+        if not self.shared:
+            return [(self.author, roll)]
+        players = [(self.guild.get_member(user_id), count) for user_id, count in self.contributions.items()]
+        players = [(member, count) for member, count in players if member is not None]
+        if len(players) == 0:
+            return []
+        players.sort(key=lambda p: p[1], reverse=True)
+        pot = roll * len(players)
+        total = sum(count for member, count in players)
+        shares = [[member, pot * count // total] for member, count in players]
+        shares[0][1] += pot - sum(amount for member, amount in shares)
+        return [(member, amount) for member, amount in shares if amount > 0]
     
-    async def get_guess(self, ctx):
-        try:        
-            def check_msg(m):
-                return len(m.content.lower())==1 and m.author==ctx.author
-            
-            msg = await ctx.bot.wait_for("message", check=check_msg, timeout=60)
-            guess = msg.content.lower()
-            await msg.delete()
-            return guess
-        except asyncio.TimeoutError:
-            return None
-        return None
+    async def word_embed(self, won=False, payouts=()):
+        if not won:
+            desc, colour = board(self.word, self.reveal, self.guessed_letters, self.mistakes, self.last_guess_good)
+            return discord.Embed(description=desc, colour=colour)
+        currency = await self.cog.currency.get(self.guild)
+        if self.shared:
+            shares = [(member.display_name, amount) for member, amount in payouts]
+            desc, colour = board(self.word, self.reveal, self.guessed_letters, self.mistakes, self.last_guess_good, True, currency=currency, shares=shares)
+        else:
+            winnings = payouts[0][1] if payouts else 0
+            desc, colour = board(self.word, self.reveal, self.guessed_letters, self.mistakes, self.last_guess_good, True, winnings, currency)
+        return discord.Embed(description=desc, colour=colour)
     
-    async def guess(self, ctx, g):
+    async def get_guess(self):
+        def check_msg(m):
+            content = m.content.lower()
+            # only letters count as guesses, so "k" or "?" in a busy channel isn't eaten as a wrong one
+            return (len(content)==1 and content.isalpha()) or content.startswith(self.prefix+" ")
+        
+        msg = await self.cog.guesses.wait(self.key, check_msg, 60)
+        if msg is None or msg is CLOSED:
+            return msg
+        self.cog.updates.delete(msg)
+        return msg
+    
+    async def guess(self, g, player=None):
         if g in self.guessed_letters:
             return
     
         self.guessed_letters[g] = True
-        success = False
-        for i, c in enumerate(self.word):
-            if c == g:
-                success = True
-                self.word_guessing = self.word_guessing[:i] + g + self.word_guessing[i+1:]
-                
+        success = self.reveal_letter(g)
         if not success:
             self.mistakes += 1
+        elif player is not None:
+            self.contributions[player.id] = self.contributions.get(player.id, 0) + len(self.positions[g])
             
         self.last_guess_good = success
+
+    # "guess YOURWORD", a right answer wins outright and a wrong one is a mistake
+    def guess_word(self, attempt, player=None):
+        if normalise(attempt) != normalise(self.word):
+            self.mistakes += 1
+            self.last_guess_good = False
+            return
+        if player is not None and self.hidden > 0:
+            self.contributions[player.id] = self.contributions.get(player.id, 0) + self.hidden
+        for g in self.positions:
+            self.reveal_letter(g)
+        self.last_guess_good = True
+
+    # Fills in every position of the letter, returns whether it was in the word
+    def reveal_letter(self, g):
+        positions = self.positions.get(g)
+        if not positions or self.reveal[positions[0]] == g:
+            return bool(positions)
+        for i in positions:
+            self.reveal[i] = g
+        self.hidden -= len(positions)
+        return True
                 
     def check_win(self):
-        return self.word_guessing == self.word
+        return self.hidden == 0
         
     def check_loss(self):
-        return self.mistakes >= 6
\ No newline at end of file
+        return self.mistakes >= 6
@@ -0,0 +1,82 @@
+# Standard Library
+import asyncio
+import logging
+
+# Red
+from redbot.core import bank
+from redbot.core.errors import BalanceTooHigh
+
+log = logging.getLogger("red.remcogs.hangman")
+
+
+class PayoutQueue:
+    """Pays hangman winnings out in batches instead of one bank write per win.
+
+    Winnings are added up per (guild, member) and paid every `interval`
+    seconds, one deposit per member, clamped so nobody goes over the bank's
+    max balance. Whatever's left is paid when the cog unloads. A payment
+    that fails is logged and kept for the next batch, and winnings from DM
+    games are dropped when the bank is per-server, there's no bank to pay.
+    """
+
+    def __init__(self, interval=10):
+        self.interval = interval
+        self._owed = {}
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def add(self, member, amount):
+        guild = getattr(member, "guild", None)
+        key = (guild.id if guild is not None else None, member.id)
+        owed = self._owed.get(key)
+        if owed is None:
+            self._owed[key] = [member, amount]
+        else:
+            owed[1] += amount
+
+    async def flush(self):
+        owed, self._owed = self._owed, {}
+        try:
+            is_global = await bank.is_global()
+        except Exception:
+            self._put_back(owed)
+            raise
+        for key, (member, amount) in owed.items():
+            guild = getattr(member, "guild", None)
+            if guild is None and not is_global:
+                continue
+            try:
+                await self._pay(member, guild, amount)
+            except Exception:
+                log.exception("Couldn't pay "+str(amount)+" hangman winnings to "+str(member.id)+", trying again next batch")
+                self._put_back({key: [member, amount]})
+
+    async def _pay(self, member, guild, amount):
+        room = await bank.get_max_balance(guild) - await bank.get_balance(member)
+        amount = min(amount, room)
+        if amount <= 0:
+            return
+        try:
+            await bank.deposit_credits(member, amount)
+        except BalanceTooHigh as e:
+            await bank.set_balance(member, e.max_balance)
+
+    def _put_back(self, owed):
+        for member, amount in owed.values():
+            self.add(member, amount)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Paying out hangman winnings failed")
@@ -0,0 +1,103 @@
+# Standard Library
+import json
+import sys
+from collections import Counter
+
+# How much each part counts towards a word's score before history is mixed in
+RARITY_WEIGHT   = 0.40
+DISTINCT_WEIGHT = 0.35
+LENGTH_WEIGHT   = 0.25
+
+# Plays needed before a word's solve rate counts fully
+HISTORY_PLAYS = 20
+
+
+def letters(word):
+    return set(word) - {"-", " "}
+
+
+def load_history(log_path):
+    """{word: (plays, wins)} from the stats log, read a line at a time."""
+    history = {}
+    try:
+        with open(log_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                plays, wins = history.get(entry["word"], (0, 0))
+                history[entry["word"]] = (plays + 1, wins + (entry["outcome"] == "win"))
+    except FileNotFoundError:
+        pass
+    return history
+
+
+def score_words(words, history=None):
+    """Scores every word from 0 (easiest) to 1 (hardest), returns {word: (score, weight)}.
+
+    A word is harder the rarer its letters are across the corpus, the fewer
+    different letters it has and the shorter it is. Once a word has been
+    played, its observed solve rate is mixed in. Scores are turned into
+    percentile ranks so each third of the range holds a third of the words.
+
+    Weights favour words that haven't been played much, so sampling from a
+    band doesn't keep serving the same few words.
+    """
+    history = history or {}
+    letter_counts = Counter()
+    for word in words:
+        letter_counts.update(letters(word))
+    most_common = max(letter_counts.values()) if letter_counts else 1
+
+    raw = {}
+    for word in words:
+        distinct = letters(word)
+        if not distinct:
+            continue
+        rarity = sum(1 - letter_counts[c] / most_common for c in distinct) / len(distinct)
+        score = (
+            RARITY_WEIGHT * rarity
+            + DISTINCT_WEIGHT * (1 - min(len(distinct), 10) / 10)
+            + LENGTH_WEIGHT * (1 - min(len(word), 12) / 12)
+        )
+        plays, wins = history.get(word, (0, 0))
+        if plays:
+            seen = min(plays, HISTORY_PLAYS) / HISTORY_PLAYS
+            score = (1 - seen / 2) * score + (seen / 2) * (1 - wins / plays)
+        raw[word] = score
+
+    ranked = sorted(raw, key=raw.get)
+    last = max(1, len(ranked) - 1)
+    return {word: (i / last, 1 / (1 + history.get(word, (0, 0))[0])) for i, word in enumerate(ranked)}
+
+
+def write_scores(path, scores):
+    """Tab separated word, score and weight, easiest first."""
+    with open(path, "w") as f:
+        for word, (score, weight) in sorted(scores.items(), key=lambda item: item[1][0]):
+            f.write(f"{word}\t{score:.5f}\t{weight:.5f}\n")
+
+
+def read_scores(path):
+    """Parallel lists of words, scores and weights, sorted by score."""
+    words, scores, weights = [], [], []
+    with open(path) as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) != 3:
+                continue
+            words.append(parts[0])
+            scores.append(float(parts[1]))
+            weights.append(float(parts[2]))
+    return words, scores, weights
+
+
+# python -m hangman.scoring words.txt [results.jsonl], writes words.txt.scores next to words.txt
+if __name__ == "__main__":
+    words_path = sys.argv[1]
+    with open(words_path) as f:
+        words = [line.strip() for line in f if line.strip()]
+    history = load_history(sys.argv[2]) if len(sys.argv) > 2 else None
+    write_scores(words_path + ".scores", score_words(words, history))
+    print(words_path+".scores: scored "+str(len(words))+" words")
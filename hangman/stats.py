@@ -0,0 +1,110 @@
+# Standard Library
+import asyncio
+import json
+import logging
+import time
+
+WIN     = "win"
+LOSS    = "loss"
+TIMEOUT = "timeout"
+
+log = logging.getLogger("red.remcogs.hangman")
+
+
+def empty_totals():
+    return {"games": 0, "wins": 0, "losses": 0, "timeouts": 0, "mistakes": 0, "duration": 0, "winnings": 0}
+
+
+def empty_player():
+    return {"games": 0, "wins": 0, "winnings": 0}
+
+
+class StatsStore:
+    """Hangman results, as a raw log plus running totals.
+
+    Every finished game is appended to a JSON lines file and never read back
+    by the cog. Per-guild and per-player totals are updated as games finish
+    and kept in memory, then saved to Config in batches, so the leaderboard
+    only ever reads the totals.
+    """
+
+    def __init__(self, config, log_path, interval=30):
+        self.config = config
+        self.log_path = log_path
+        self.interval = interval
+        self._guilds = {}
+        self._guilds_by_id = {}
+        self._dirty = set()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def get(self, guild):
+        stats = self._guilds.get(guild.id)
+        if stats is None:
+            stats = await self.config.guild(guild).stats()
+            stats.setdefault("totals", empty_totals())
+            stats.setdefault("players", {})
+            self._guilds[guild.id] = stats
+            self._guilds_by_id[guild.id] = guild
+        return stats
+
+    async def record(self, guild, word, outcome, mistakes, duration, players):
+        """Logs a finished game. `players` is a list of (member id, winnings)."""
+        entry = {
+            "time": int(time.time()),
+            "guild": guild.id if guild is not None else None,
+            "word": word,
+            "outcome": outcome,
+            "mistakes": mistakes,
+            "duration": duration,
+            "players": players,
+        }
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(entry)+"\n")
+
+        if guild is None:
+            return
+        stats = await self.get(guild)
+        totals = stats["totals"]
+        totals["games"] += 1
+        totals[{WIN: "wins", LOSS: "losses", TIMEOUT: "timeouts"}[outcome]] += 1
+        totals["mistakes"] += mistakes
+        totals["duration"] += duration
+        for user_id, winnings in players:
+            player = stats["players"].setdefault(str(user_id), empty_player())
+            player["games"] += 1
+            if outcome == WIN:
+                player["wins"] += 1
+            player["winnings"] += winnings
+            totals["winnings"] += winnings
+        self._dirty.add(guild.id)
+
+    async def leaderboard(self, guild, sort="wins"):
+        """(user id, player totals) pairs, best first."""
+        players = (await self.get(guild))["players"]
+        return sorted(((int(k), v) for k, v in players.items()), key=lambda p: (p[1][sort], p[1]["wins"]), reverse=True)
+
+    async def flush(self):
+        dirty, self._dirty = self._dirty, set()
+        for guild_id in dirty:
+            try:
+                await self.config.guild(self._guilds_by_id[guild_id]).stats.set(self._guilds[guild_id])
+            except Exception:
+                log.exception("Couldn't save hangman stats for guild "+str(guild_id)+", trying again next flush")
+                self._dirty.add(guild_id)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Saving hangman stats failed")
@@ -0,0 +1,116 @@
+# Standard Library
+import asyncio
+import time
+
+# Discord
+import discord
+
+
+class BoardUpdater:
+    """Keeps hangman's message edits and guess deletions under Discord's rate limits.
+
+    Edits to a message are sent at most once per `interval` seconds; anything
+    asked for in between replaces the pending edit, so only the latest board
+    goes out. Guess deletions are gathered per channel for `interval` seconds
+    and removed with one bulk delete where the bot is allowed to.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._pending = {}
+        self._last_edit = {}
+        self._edit_tasks = {}
+        self._deletes = {}
+        self._delete_tasks = {}
+
+        self.edits_requested = 0
+        self.edits_sent = 0
+        self.deletes_requested = 0
+        self.delete_calls = 0
+
+    async def edit(self, message, **fields):
+        self.edits_requested += 1
+        self._pending[message.id] = (message, fields)
+        if message.id in self._edit_tasks:
+            return
+        wait = self._last_edit.get(message.id, 0) + self.interval - time.monotonic()
+        if wait <= 0:
+            await self._send(message.id)
+        else:
+            self._edit_tasks[message.id] = asyncio.create_task(self._send_later(message.id, wait))
+
+    async def flush(self, message):
+        """Sends the message's pending edit now, for when a game ends."""
+        task = self._edit_tasks.pop(message.id, None)
+        if task is not None:
+            task.cancel()
+        await self._send(message.id)
+        self._last_edit.pop(message.id, None)
+
+    def delete(self, message):
+        self.deletes_requested += 1
+        channel = message.channel
+        self._deletes.setdefault(channel.id, []).append(message)
+        if channel.id not in self._delete_tasks:
+            self._delete_tasks[channel.id] = asyncio.create_task(self._delete_later(channel))
+
+    @property
+    def edits_saved(self):
+        return self.edits_requested - self.edits_sent
+
+    @property
+    def delete_calls_saved(self):
+        return self.deletes_requested - self.delete_calls - sum(len(batch) for batch in self._deletes.values())
+
+    def close(self):
+        for task in list(self._edit_tasks.values()) + list(self._delete_tasks.values()):
+            task.cancel()
+        self._edit_tasks.clear()
+        self._delete_tasks.clear()
+
+    async def _send_later(self, message_id, wait):
+        await asyncio.sleep(wait)
+        self._edit_tasks.pop(message_id, None)
+        await self._send(message_id)
+
+    async def _send(self, message_id):
+        pending = self._pending.pop(message_id, None)
+        if pending is None:
+            return
+        message, fields = pending
+        self._last_edit[message_id] = time.monotonic()
+        self.edits_sent += 1
+        try:
+            await message.edit(**fields)
+        except discord.NotFound:
+            pass
+
+    async def _delete_later(self, channel):
+        await asyncio.sleep(self.interval)
+        self._delete_tasks.pop(channel.id, None)
+        batch = self._deletes.pop(channel.id, [])
+        if len(batch) == 0:
+            return
+
+        guild = getattr(channel, "guild", None)
+        can_bulk = guild is not None and channel.permissions_for(guild.me).manage_messages
+        # bulk deletes take 2-100 messages
+        if can_bulk and len(batch) > 1:
+            for i in range(0, len(batch), 100):
+                chunk = batch[i:i+100]
+                self.delete_calls += 1
+                try:
+                    if len(chunk) > 1:
+                        await channel.delete_messages(chunk)
+                    else:
+                        await chunk[0].delete()
+                except (discord.NotFound, discord.Forbidden):
+                    pass
+            return
+
+        for message in batch:
+            self.delete_calls += 1
+            try:
+                await message.delete()
+            except (discord.NotFound, discord.Forbidden):
+                pass
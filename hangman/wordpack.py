@@ -0,0 +1,103 @@
+# Standard Library
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+
+# Local
+from .words import in_difficulty
+
+INDEX_SUFFIX = ".idx"
+OFFSET = struct.Struct("<Q")
+
+
+def index_path(words_path):
+    return str(words_path) + INDEX_SUFFIX
+
+
+def write_offsets(f, offsets):
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    f.write(offsets.tobytes())
+
+
+def build_index(words_path):
+    """Writes a `<words_path>.idx` holding the byte offset of every word, returns the word count.
+
+    The wordlist is streamed, so this is fine for packs far bigger than memory.
+    """
+    offsets = array("Q")
+    count = 0
+    offset = 0
+    with open(words_path, "rb") as words, open(index_path(words_path) + ".tmp", "wb") as index:
+        for line in words:
+            if line.strip():
+                offsets.append(offset)
+                count += 1
+            offset += len(line)
+            if len(offsets) >= 65536:
+                write_offsets(index, offsets)
+                del offsets[:]
+        write_offsets(index, offsets)
+    os.replace(index_path(words_path) + ".tmp", index_path(words_path))
+    return count
+
+
+class WordPack:
+    """A wordlist on disk with a prebuilt line offset index, see build_index.
+
+    Both files are memory mapped, so picking a word reads one offset and one
+    line no matter how big the pack is. Picks the same way as WordCorpus.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = os.stat(index_path(path)).st_size // OFFSET.size
+        self._words_file = open(path, "rb")
+        self._index_file = open(index_path(path), "rb")
+        self.words = None
+        self.index = None
+        # mmap can't map empty files
+        if self.count > 0:
+            self.words = mmap.mmap(self._words_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def is_stale(path):
+        idx = index_path(path)
+        return not os.path.exists(idx) or os.stat(idx).st_mtime < os.stat(path).st_mtime
+
+    def word_at(self, i):
+        (start,) = OFFSET.unpack_from(self.index, i * OFFSET.size)
+        end = self.words.find(b"\n", start)
+        if end == -1:
+            end = len(self.words)
+        return self.words[start:end].decode("utf-8").strip().lower()
+
+    def pick(self, difficulty=None, tries=20):
+        """A random word. Difficulty is best effort, a few words are tried before giving up on it."""
+        if self.count == 0:
+            return None
+        word = self.word_at(random.randrange(self.count))
+        if difficulty is None:
+            return word
+        for _ in range(tries):
+            if in_difficulty(word, difficulty):
+                return word
+            word = self.word_at(random.randrange(self.count))
+        return word
+
+    def close(self):
+        if self.count > 0:
+            self.words.close()
+            self.index.close()
+        self._words_file.close()
+        self._index_file.close()
+
+
+# python -m hangman.wordpack words.txt [more.txt ...]
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(path+": indexed "+str(build_index(path))+" words")
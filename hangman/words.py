@@ -0,0 +1,110 @@
+# Standard Library
+import os
+import random
+from bisect import bisect_left
+from bisect import bisect_right
+from itertools import accumulate
+
+# Local
+from .scoring import read_scores
+
+# Words with lots of different letters are easier, most guesses hit something
+DIFFICULTIES = {
+    "easy":   (7, None),
+    "medium": (5, 6),
+    "hard":   (None, 4),
+}
+
+
+# Score ranges for each difficulty when the wordlist has been scored, see scoring.py
+SCORE_BANDS = {
+    "easy":   (0.0, 1/3),
+    "medium": (1/3, 2/3),
+    "hard":   (2/3, 1.0),
+}
+
+
+def distinct_letters(word):
+    return len(set(word) - {"-", " "})
+
+
+def in_difficulty(word, difficulty):
+    low, high = DIFFICULTIES[difficulty]
+    count = distinct_letters(word)
+    return (low is None or count >= low) and (high is None or count <= high)
+
+
+class WordCorpus:
+    """The hangman wordlist, loaded once and kept in memory.
+
+    Words are indexed by difficulty, so picking one is a random.choice over
+    a prebuilt list. The file is only read again if its mtime changes.
+
+    If the first of `scores_paths` that exists scores exactly these words,
+    difficulties come from its score bands instead: words are kept sorted by
+    score with cumulative weights, so a band is two bisects and a weighted
+    pick is a third.
+    """
+
+    def __init__(self, path, scores_paths=()):
+        self.path = path
+        self.scores_paths = scores_paths
+        self.mtime = None
+        self.words = []
+        self.scored_words = []
+        self.scores = []
+        self.cumulative = []
+        self.by_difficulty = {}
+
+    def scores_path(self):
+        for path in self.scores_paths:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def load(self):
+        mtime = os.stat(self.path).st_mtime
+        scores_path = self.scores_path()
+        if scores_path is not None:
+            mtime = (mtime, os.stat(scores_path).st_mtime)
+        if mtime == self.mtime:
+            return
+        with open(self.path) as f:
+            words = [line.strip() for line in f if line.strip()]
+
+        by_difficulty = {}
+        for difficulty in DIFFICULTIES:
+            by_difficulty[difficulty] = [word for word in words if in_difficulty(word, difficulty)]
+
+        self.words = words
+        self.by_difficulty = by_difficulty
+        self.scored_words, self.scores, self.cumulative = [], [], []
+        if scores_path is not None:
+            scored_words, scores, weights = read_scores(scores_path)
+            # scores for a different version of the wordlist can't be trusted
+            if set(scored_words) == set(words):
+                self.scored_words, self.scores = scored_words, scores
+                self.cumulative = [0.0] + list(accumulate(weights))
+        self.mtime = mtime
+
+    def pick(self, difficulty=None):
+        """A random word, from the given difficulty if there is one. Raises FileNotFoundError."""
+        self.load()
+        if difficulty is not None and self.scored_words:
+            return self.pick_scored(*SCORE_BANDS[difficulty])
+        words = self.words
+        if difficulty is not None:
+            words = self.by_difficulty.get(difficulty) or words
+        if len(words) == 0:
+            return None
+        return random.choice(words)
+
+    # Weighted pick from the words scoring between low and high
+    def pick_scored(self, low, high):
+        start = bisect_left(self.scores, low)
+        end = bisect_right(self.scores, high)
+        if start >= end:
+            return random.choice(self.scored_words)
+        target = random.uniform(self.cumulative[start], self.cumulative[end])
+        i = bisect_right(self.cumulative, target) - 1
+        return self.scored_words[min(max(i, start), end - 1)]
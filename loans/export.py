@@ -0,0 +1,177 @@
+# Standard Library
+import csv
+import struct
+import zlib
+from array import array
+from itertools import islice
+
+CSV     = "csv"
+COLUMNS = "bin"
+FORMATS = (CSV, COLUMNS)
+
+FIELDS = ("loaner", "loanee", "original_amount", "outstanding", "interest", "interest_calc_day")
+
+# Start of every columnar file, then chunks until the end of the file
+MAGIC = b"LOANCOL1"
+# Rows in the chunk, then each column's compressed length
+CHUNK_HEADER = struct.Struct("<I6I")
+# array typecodes for each of FIELDS, -1 stands in for None in the last two
+TYPECODES = ("Q", "Q", "q", "q", "i", "i")
+
+CHUNK_SIZE = 65536
+
+MAX_AMOUNT   = 10_000_000_000_000
+MAX_INTEREST = 1000
+
+
+def write(path, loans, file_format=CSV):
+    """Writes loan dicts to `path` as they come, returns how many were written."""
+    if file_format == COLUMNS:
+        return write_columns(path, loans)
+    return write_csv(path, loans)
+
+
+def read(path):
+    """Yields loan dicts from a file written by `write`, whichever format it's in."""
+    with open(path, "rb") as f:
+        is_columns = f.read(len(MAGIC)) == MAGIC
+    return read_columns(path) if is_columns else read_csv(path)
+
+
+def check(path):
+    """Reads the whole file without keeping anything, raises ValueError if it's no good."""
+    count = 0
+    for loan0 in read(path):
+        count += 1
+    return count
+
+
+def chunks(loans, size=CHUNK_SIZE):
+    """Lists of up to `size` loans at a time, for handing a read over piece by piece."""
+    loans = iter(loans)
+    while True:
+        chunk = list(islice(loans, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(path, loans):
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for loan0 in loans:
+            writer.writerow(["" if loan0.get(field) is None else loan0[field] for field in FIELDS])
+            count += 1
+    return count
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None or tuple(header[:2]) != FIELDS[:2]:
+            raise ValueError("Not a loan export, the first line should start with "+",".join(FIELDS[:2]))
+        columns = {name: i for i, name in enumerate(header)}
+        for row in reader:
+            if not row:
+                continue
+            values = {}
+            for field in FIELDS:
+                i = columns.get(field)
+                value = row[i] if i is not None and i < len(row) else ""
+                values[field] = value if field in ("loaner", "loanee") else (int(value) if value != "" else None)
+            loan0 = clean(values)
+            if loan0 is not None:
+                yield loan0
+
+
+def write_columns(path, loans, chunk_size=CHUNK_SIZE):
+    """Writes loans in chunks of `chunk_size` rows, each stored column by column and compressed."""
+    count = 0
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        columns = [array(code) for code in TYPECODES]
+        for loan0 in loans:
+            columns[0].append(int(loan0["loaner"]))
+            columns[1].append(int(loan0["loanee"]))
+            columns[2].append(loan0.get("original_amount") or loan0["outstanding"])
+            columns[3].append(loan0["outstanding"])
+            columns[4].append(-1 if loan0.get("interest") is None else loan0["interest"])
+            columns[5].append(-1 if loan0.get("interest_calc_day") is None else loan0["interest_calc_day"])
+            count += 1
+            if len(columns[0]) >= chunk_size:
+                write_chunk(f, columns)
+                columns = [array(code) for code in TYPECODES]
+        if len(columns[0]):
+            write_chunk(f, columns)
+    return count
+
+
+def write_chunk(f, columns):
+    packed = [zlib.compress(column.tobytes(), 6) for column in columns]
+    f.write(CHUNK_HEADER.pack(len(columns[0]), *(len(data) for data in packed)))
+    for data in packed:
+        f.write(data)
+
+
+def read_columns(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a columnar loan export")
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) == 0:
+                return
+            if len(header) < CHUNK_HEADER.size:
+                raise ValueError("Loan export is cut short")
+            rows, *lengths = CHUNK_HEADER.unpack(header)
+            columns = []
+            for code, length in zip(TYPECODES, lengths):
+                column = array(code)
+                column.frombytes(zlib.decompress(f.read(length)))
+                if len(column) != rows:
+                    raise ValueError("Loan export is corrupt, a column's the wrong length")
+                columns.append(column)
+            for loaner, loanee, original_amount, outstanding, interest, calc_day in zip(*columns):
+                loan0 = clean({
+                    "loaner": str(loaner),
+                    "loanee": str(loanee),
+                    "original_amount": original_amount,
+                    "outstanding": outstanding,
+                    "interest": None if interest < 0 else interest,
+                    "interest_calc_day": None if calc_day < 0 else calc_day,
+                })
+                if loan0 is not None:
+                    yield loan0
+
+
+# Clamps a row to what the cog allows, None if it isn't a loan at all
+def clean(values):
+    loaner_key = values["loaner"]
+    loanee_key = values["loanee"]
+    if not loaner_key.isdigit() or not loanee_key.isdigit() or loaner_key == loanee_key:
+        return None
+    outstanding = values["outstanding"]
+    if outstanding is None or outstanding <= 0:
+        return None
+    outstanding = min(MAX_AMOUNT, outstanding)
+    loan0 = {
+        "original_amount": min(MAX_AMOUNT, max(0, values["original_amount"] or outstanding)),
+        "outstanding": outstanding,
+        "interest": None if not values["interest"] else min(MAX_INTEREST, max(0, values["interest"])),
+        "loaner": loaner_key,
+        "loanee": loanee_key,
+    }
+    if values["interest_calc_day"] is not None:
+        loan0["interest_calc_day"] = values["interest_calc_day"]
+    return loan0
+
+
+def ledger_loans(ledger):
+    """Every loan in a ledger, one at a time."""
+    for loan_dict in ledger.values():
+        for loan0 in loan_dict.values():
+            if loan0 is not None:
+                yield loan0
@@ -0,0 +1,68 @@
+# Standard Library
+from math import log
+from math import log1p
+
+SIMPLE   = "simple"
+COMPOUND = "compound"
+MODES    = (SIMPLE, COMPOUND)
+
+MAX_AMOUNT = 10_000_000_000_000
+
+
+def overflows(rate, days):
+    """Whether `days` of compound interest at `rate`% multiplies a balance past MAX_AMOUNT."""
+    return days * log1p(rate / 100) > log(MAX_AMOUNT)
+
+
+def growth(rate, days):
+    """Daily compound growth over `days` days at `rate`%, as an exact (numerator, denominator) pair."""
+    return (100 + rate) ** days, 100 ** days
+
+
+def balance(outstanding, rate, days, mode=COMPOUND):
+    """Balance of a loan `days` days after its interest was last calculated.
+
+    The result only depends on the inputs, not on how often it was looked at
+    in between, so it's safe to call for any target day. Worked out in
+    integers and rounded up, floats can land a credit over.
+    """
+    if not rate or days <= 0 or outstanding <= 0:
+        return outstanding
+    if mode == SIMPLE:
+        owed = outstanding - (-outstanding * rate * days // 100)
+    elif overflows(rate, days):
+        # anything this big is getting clamped anyway, don't build a huge power
+        return MAX_AMOUNT
+    else:
+        numerator, denominator = growth(rate, days)
+        owed = -(-outstanding * numerator // denominator)
+    return min(MAX_AMOUNT, owed)
+
+
+def balances(outstandings, rates, calc_days, day, mode=COMPOUND):
+    """`balance()` for a whole ledger at once.
+
+    Takes parallel sequences (one entry per loan) and returns a list of
+    balances on `day`. Loans without a calc day are treated as one day old.
+    Growth factors are shared between loans with the same rate and age, so a
+    guild full of 5% loans costs one power per distinct age.
+    """
+    factors = {}
+    ret = []
+    for outstanding, rate, calc_day in zip(outstandings, rates, calc_days):
+        days = 1 if calc_day is None else day - calc_day
+        if not rate or days <= 0 or outstanding <= 0:
+            ret.append(outstanding)
+            continue
+        if mode == SIMPLE:
+            ret.append(min(MAX_AMOUNT, outstanding - (-outstanding * rate * days // 100)))
+            continue
+        factor = factors.get((rate, days))
+        if factor is None:
+            factor = factors[(rate, days)] = None if overflows(rate, days) else growth(rate, days)
+        if factor is None:
+            ret.append(MAX_AMOUNT)
+            continue
+        numerator, denominator = factor
+        ret.append(min(MAX_AMOUNT, -(-outstanding * numerator // denominator)))
+    return ret
@@ -0,0 +1,185 @@
+# Standard Library
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+GIVE    = "give"
+EXTEND  = "extend"
+REPAY   = "repay"
+FORGIVE = "forgive"
+ACCRUE  = "accrue"
+SETTLE  = "settle"
+IMPORT  = "import"
+CLEAR   = "clear"
+
+
+class LoanJournal():
+    """An append-only log of every change to each guild's loans.
+
+    Each guild gets a JSON lines file in `path`, one event per line with a
+    sequence number. Events carry the loan as it was left afterwards, so
+    replaying them in order rebuilds the ledger without redoing any maths.
+    Every `snapshot_every` events the ledger is written out whole and the
+    log starts a new file, the old one's kept as `<guild>.<seq>.jsonl` for
+    history but replay only has to read from the snapshot on. A guild's
+    first event is snapshotted straight away, so there's always a base to
+    replay from even when the guild had loans before it had a journal.
+
+    Snapshots are written off the event loop, call `append` and `snapshot`
+    holding the guild's ledger lock so the ledger can't change under them.
+    """
+
+    def __init__(self, path, snapshot_every=1000):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self._seqs = {}
+        self._since_snapshot = {}
+        os.makedirs(path, exist_ok=True)
+
+    def log_path(self, guild_id):
+        return os.path.join(self.path, str(guild_id)+".jsonl")
+
+    def snapshot_path(self, guild_id):
+        return os.path.join(self.path, str(guild_id)+".snapshot.json")
+
+    def has_base(self, guild_id):
+        return os.path.exists(self.snapshot_path(guild_id))
+
+    async def append(self, guild_id, event, ledger, **fields):
+        """Logs an event, `ledger` is the guild's ledger after it, for snapshotting."""
+        seq = self._next_seq(guild_id)
+        entry = {"seq": seq, "time": int(time.time()), "event": event}
+        entry.update(fields)
+        with open(self.log_path(guild_id), "a") as f:
+            f.write(json.dumps(entry)+"\n")
+        self._since_snapshot[guild_id] += 1
+        if self._since_snapshot[guild_id] >= self.snapshot_every or not self.has_base(guild_id):
+            await self.snapshot(guild_id, ledger)
+
+    async def snapshot(self, guild_id, ledger):
+        seq = self._seqs[guild_id]
+        await asyncio.get_running_loop().run_in_executor(None, self._write_snapshot, guild_id, seq, ledger)
+        self._since_snapshot[guild_id] = 0
+
+    def _write_snapshot(self, guild_id, seq, ledger):
+        tmp_path = self.snapshot_path(guild_id)+".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"seq": seq, "ledger": ledger}, f)
+        os.replace(tmp_path, self.snapshot_path(guild_id))
+        if os.path.exists(self.log_path(guild_id)):
+            os.replace(self.log_path(guild_id), os.path.join(self.path, str(guild_id)+"."+str(seq)+".jsonl"))
+
+    def guild_ids(self):
+        return {int(name.split(".")[0]) for name in os.listdir(self.path) if name.split(".")[0].isdigit()}
+
+    def replay(self, guild_id):
+        """Rebuilds a guild's ledger from its last snapshot and the events after it, a line at a time."""
+        seq, ledger = self._read_snapshot(guild_id)
+        for entry in self._read(self.log_path(guild_id)):
+            if entry["seq"] > seq:
+                apply_event(ledger, entry)
+        return ledger
+
+    def history(self, guild_id, member_key=None, limit=100):
+        """The guild's latest events, newest first, only ones involving member_key if it's given.
+
+        A member's history leaves out the nightly interest runs, they'd be
+        every other line for anyone with an interest bearing loan.
+        """
+        found = []
+        for path in self._segments(guild_id):
+            matches = deque(maxlen=limit-len(found))
+            for entry in self._read(path):
+                if member_key is None or (entry["event"] != ACCRUE and member_key in involved(entry)):
+                    matches.append(entry)
+            found.extend(reversed(matches))
+            if len(found) >= limit:
+                break
+        return found
+
+    def _next_seq(self, guild_id):
+        if guild_id not in self._seqs:
+            seq, ledger = self._read_snapshot(guild_id)
+            count = 0
+            for entry in self._read(self.log_path(guild_id)):
+                seq = max(seq, entry["seq"])
+                count += 1
+            self._seqs[guild_id] = seq
+            self._since_snapshot[guild_id] = count
+        self._seqs[guild_id] += 1
+        return self._seqs[guild_id]
+
+    def _read_snapshot(self, guild_id):
+        try:
+            with open(self.snapshot_path(guild_id)) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0, {}
+        return snapshot["seq"], snapshot["ledger"]
+
+    # Current log first, then archived ones newest first
+    def _segments(self, guild_id):
+        prefix = str(guild_id)+"."
+        archived = []
+        for name in os.listdir(self.path):
+            parts = name[len(prefix):].split(".")
+            if name.startswith(prefix) and len(parts) == 2 and parts[0].isdigit() and parts[1] == "jsonl":
+                archived.append((int(parts[0]), os.path.join(self.path, name)))
+        return [self.log_path(guild_id)] + [path for seq, path in sorted(archived, reverse=True)]
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # half written last line from a crash
+                        continue
+        except FileNotFoundError:
+            return
+
+
+def apply_event(ledger, entry):
+    event = entry["event"]
+    if event == CLEAR:
+        ledger.clear()
+    elif event == ACCRUE:
+        for loaner_key, loanee_key, outstanding in entry["loans"]:
+            loan0 = ledger.get(loaner_key, {}).get(loanee_key)
+            if loan0 is not None:
+                loan0["outstanding"] = outstanding
+                loan0["interest_calc_day"] = entry["day"]
+    elif event == IMPORT:
+        # imports are too big to log loan by loan, there's always a snapshot straight after one
+        pass
+    elif event == SETTLE:
+        for loaner_key, loanee_key in entry["removed"]:
+            set_loan(ledger, loaner_key, loanee_key, None)
+        for loan0 in entry["loans"]:
+            set_loan(ledger, loan0["loaner"], loan0["loanee"], loan0)
+    else:
+        set_loan(ledger, entry["loaner"], entry["loanee"], entry["loan"])
+
+
+def set_loan(ledger, loaner_key, loanee_key, loan0):
+    if loan0 is None:
+        loan_dict = ledger.get(loaner_key, {})
+        loan_dict.pop(loanee_key, None)
+        if not loan_dict:
+            ledger.pop(loaner_key, None)
+    else:
+        ledger.setdefault(loaner_key, {})[loanee_key] = dict(loan0)
+
+
+# Member keys an event is about
+def involved(entry):
+    if "loaner" in entry:
+        return (entry["loaner"], entry["loanee"])
+    if entry["event"] == SETTLE:
+        return {key for pair in entry["removed"] for key in pair} | {key for loan0 in entry["loans"] for key in (loan0["loaner"], loan0["loanee"])}
+    if entry["event"] == ACCRUE:
+        return {key for loaner_key, loanee_key, outstanding in entry["loans"] for key in (loaner_key, loanee_key)}
+    return ()
@@ -0,0 +1,296 @@
+# Standard Library
+import asyncio
+import contextlib
+import copy
+import logging
+import time
+from collections import OrderedDict
+
+log = logging.getLogger("red.remcogs.loans")
+
+
+class LedgerIndex():
+    """Secondary indexes over one guild's ledger.
+
+    The ledger itself is keyed loaner -> loanee, this adds loanee -> loaners
+    plus running totals of what each user has lent out and owes, so lookups
+    by either side only touch that user's loans.
+    """
+
+    def __init__(self, ledger):
+        self.by_loanee = {}
+        self.lent = {}
+        self.owed = {}
+        self._counted = {}
+        for loan_dict in ledger.values():
+            for loan0 in loan_dict.values():
+                if loan0 is not None:
+                    self.put(loan0)
+
+    def put(self, loan0):
+        loaner_key = loan0["loaner"]
+        loanee_key = loan0["loanee"]
+        self.discard(loaner_key, loanee_key)
+        amount = loan0["outstanding"]
+        self.by_loanee.setdefault(loanee_key, set()).add(loaner_key)
+        self.lent[loaner_key] = self.lent.get(loaner_key, 0) + amount
+        self.owed[loanee_key] = self.owed.get(loanee_key, 0) + amount
+        self._counted[(loaner_key, loanee_key)] = amount
+
+    def discard(self, loaner_key, loanee_key):
+        amount = self._counted.pop((loaner_key, loanee_key), None)
+        if amount is None:
+            return
+        loaners = self.by_loanee[loanee_key]
+        loaners.discard(loaner_key)
+        if not loaners:
+            del self.by_loanee[loanee_key]
+        self.lent[loaner_key] -= amount
+        if not self.lent[loaner_key]:
+            del self.lent[loaner_key]
+        self.owed[loanee_key] -= amount
+        if not self.owed[loanee_key]:
+            del self.owed[loanee_key]
+
+    def loaners_of(self, loanee_key):
+        return self.by_loanee.get(loanee_key, ())
+
+
+# The custom Config group each loan is stored in, keyed guild id -> loaner id -> loanee id
+LOAN_GROUP = "LOAN"
+
+# In a guild's dirty set, means the whole ledger needs writing rather than single loans
+WHOLE_LEDGER = None
+
+
+class LedgerCache():
+    """Keeps each guild's loan ledger resident in memory in front of Config.
+
+    Every loan is its own record in the LOAN custom group, so saving a change
+    only writes that one loan. Reads are served from memory and writes go
+    straight through to Config. Loans whose write hasn't landed yet are dirty
+    and get written again on `flush()` or before their guild's evicted.
+    Guilds are dropped least recently used first once there's more than
+    `max_guilds` of them cached, or once they've sat idle for `idle_timeout`
+    seconds.
+
+    Ledgers from before the LOAN group, kept as one dict in the guild's
+    "loans" value, are moved over the first time they're loaded.
+
+    Anything that changes a loan and moves money should do it inside
+    `transaction()`, which serialises changes per guild.
+    """
+
+    def __init__(self, config, max_guilds=100, idle_timeout=60*60):
+        self.config = config
+        self.max_guilds = max_guilds
+        self.idle_timeout = idle_timeout
+        self._ledgers = OrderedDict()
+        self._indexes = {}
+        self._last_used = {}
+        self._dirty = {}
+        self._locks = {}
+        self._loading = {}
+        self._transactions = set()
+
+    async def get(self, guild):
+        ledger = self._ledgers.get(guild.id)
+        # every caller that misses waits on the same load, so a slow one can't overwrite a newer ledger
+        while ledger is None:
+            loading = self._loading.get(guild.id)
+            if loading is None:
+                loading = self._loading[guild.id] = asyncio.ensure_future(self._fill(guild))
+            await asyncio.shield(loading)
+            ledger = self._ledgers.get(guild.id)
+        self._touch(guild)
+        await self.evict(keep=guild.id)
+        return ledger
+
+    # Indexes are kept up to date by whoever changes a loan, see LedgerIndex.put/discard
+    async def index(self, guild):
+        await self.get(guild)
+        return self._indexes[guild.id]
+
+    async def save(self, guild, loaner_key, loanee_key):
+        """Writes the loan between loaner_key and loanee_key, or deletes it if it's gone from the ledger."""
+        await self._mark(guild, (loaner_key, loanee_key))
+
+    async def save_all(self, guild):
+        """Writes the guild's whole ledger in one go, for passes that change most of its loans."""
+        await self._mark(guild, WHOLE_LEDGER)
+
+    async def replace(self, guild, ledger):
+        """Swaps the guild's whole ledger for another one and saves it, hold the guild's lock."""
+        await self.get(guild)
+        self._ledgers[guild.id] = ledger
+        self._indexes[guild.id] = LedgerIndex(ledger)
+        await self.save_all(guild)
+
+    async def peek(self, guild):
+        """The guild's ledger for one pass over it, an uncached one's read without going into the cache.
+
+        Hold the guild's lock until the ledger's been handed to `save_peeked`.
+        """
+        ledger = self._ledgers.get(guild.id)
+        if ledger is None:
+            ledger = await self._load(guild)
+        return ledger
+
+    async def save_peeked(self, guild, ledger):
+        """Writes a ledger from `peek` in one go."""
+        if self._ledgers.get(guild.id) is not ledger and (guild.id in self._ledgers or guild.id in self._loading):
+            # loaded while we worked, nothing can change it without the lock so ours is the newer one
+            self._ledgers[guild.id] = ledger
+        if self._ledgers.get(guild.id) is ledger:
+            self._indexes[guild.id] = LedgerIndex(ledger)
+            await self.save_all(guild)
+            return
+        await self._write_ledger(guild.id, ledger)
+
+    def lock(self, guild):
+        lock = self._locks.get(guild.id)
+        if lock is None:
+            lock = self._locks[guild.id] = asyncio.Lock()
+        return lock
+
+    @contextlib.asynccontextmanager
+    async def transaction(self, guild, loaner_key, loanee_key):
+        """Holds the guild's lock and saves the changes made inside once it's done.
+
+        If the block raises, the loan between loaner_key and loanee_key is put
+        back the way it was before the error is passed on, so undo any bank
+        moves before raising.
+        """
+        async with self.lock(guild):
+            ledger = await self.get(guild)
+            before = copy.deepcopy(ledger.get(loaner_key, {}).get(loanee_key))
+            self._transactions.add(guild.id)
+            try:
+                yield ledger
+            except BaseException:
+                index = self._indexes[guild.id]
+                if before is None:
+                    ledger.get(loaner_key, {}).pop(loanee_key, None)
+                    index.discard(loaner_key, loanee_key)
+                else:
+                    ledger.setdefault(loaner_key, {})[loanee_key] = before
+                    index.put(before)
+                raise
+            finally:
+                self._transactions.discard(guild.id)
+                await self.flush(guild.id)
+
+    def is_dirty(self, guild):
+        return bool(self._dirty.get(guild.id))
+
+    async def flush(self, guild_id=None):
+        guild_ids = [guild_id] if guild_id is not None else list(self._dirty)
+        for gid in guild_ids:
+            dirty = self._dirty.pop(gid, None)
+            if not dirty:
+                continue
+            try:
+                await self._write(gid, dirty)
+            except BaseException:
+                # still dirty, try again next flush
+                self._dirty.setdefault(gid, set()).update(dirty)
+                raise
+
+    async def evict(self, keep=None):
+        now = time.monotonic()
+        stale = [gid for gid, used in self._last_used.items() if gid != keep and now - used > self.idle_timeout and not self._busy(gid)]
+        for gid in stale:
+            await self._drop(gid)
+
+        unsaved = set()
+        while len(self._ledgers) > self.max_guilds:
+            gid = next((gid for gid in self._ledgers if gid != keep and gid not in unsaved and not self._busy(gid)), None)
+            if gid is None:
+                break
+            if not await self._drop(gid):
+                unsaved.add(gid)
+
+    def clear(self):
+        # loads still running are left to finish without caching what they read
+        self._loading.clear()
+        self._ledgers.clear()
+        self._indexes.clear()
+        self._last_used.clear()
+        self._dirty.clear()
+
+    async def _fill(self, guild):
+        try:
+            ledger = await self._load(guild)
+            if guild.id not in self._ledgers and self._loading.get(guild.id) is asyncio.current_task():
+                self._ledgers[guild.id] = ledger
+                self._indexes[guild.id] = LedgerIndex(ledger)
+        finally:
+            if self._loading.get(guild.id) is asyncio.current_task():
+                del self._loading[guild.id]
+
+    async def _load(self, guild):
+        legacy = await self.config.guild(guild).loans()
+        if legacy:
+            # one loan per record from now on, the old blob goes once they're all written
+            for loaner_key, loan_dict in legacy.items():
+                for loanee_key, loan0 in (loan_dict or {}).items():
+                    if loan0 is not None:
+                        await self.config.custom(LOAN_GROUP, guild.id, loaner_key, loanee_key).set(loan0)
+            await self.config.guild(guild).loans.clear()
+        stored = await self.config.custom(LOAN_GROUP, guild.id).all()
+        ledger = {}
+        for loaner_key, loan_dict in stored.items():
+            loan_dict = {loanee_key: loan0 for loanee_key, loan0 in loan_dict.items() if loan0 is not None}
+            if loan_dict:
+                ledger[loaner_key] = loan_dict
+        return ledger
+
+    async def _write(self, guild_id, dirty):
+        ledger = self._ledgers[guild_id]
+        if WHOLE_LEDGER in dirty:
+            await self._write_ledger(guild_id, ledger)
+            return
+        for loaner_key, loanee_key in dirty:
+            record = self.config.custom(LOAN_GROUP, guild_id, loaner_key, loanee_key)
+            loan0 = ledger.get(loaner_key, {}).get(loanee_key)
+            if loan0 is None:
+                if ledger.get(loaner_key, True):
+                    await record.clear()
+                else:
+                    # their last loan, don't leave an empty loaner behind
+                    del ledger[loaner_key]
+                    await self.config.custom(LOAN_GROUP, guild_id, loaner_key).clear()
+            else:
+                await record.set(loan0)
+
+    async def _write_ledger(self, guild_id, ledger):
+        await self.config.custom(LOAN_GROUP, guild_id).set({loaner_key: loan_dict for loaner_key, loan_dict in ledger.items() if loan_dict})
+
+    async def _mark(self, guild, key):
+        self._touch(guild)
+        self._dirty.setdefault(guild.id, set()).add(key)
+        # written once when the transaction finishes
+        if guild.id in self._transactions:
+            return
+        await self.flush(guild.id)
+
+    def _busy(self, guild_id):
+        lock = self._locks.get(guild_id)
+        return guild_id in self._transactions or (lock is not None and lock.locked())
+
+    def _touch(self, guild):
+        self._ledgers.move_to_end(guild.id)
+        self._last_used[guild.id] = time.monotonic()
+
+    # Whether it went, a guild whose changes won't save stays cached and dirty for a later try
+    async def _drop(self, guild_id):
+        try:
+            await self.flush(guild_id)
+        except Exception:
+            # this runs inside some other guild's get(), their command shouldn't fail over it
+            log.exception("Couldn't save loans for guild %s, keeping them cached", guild_id)
+            return False
+        self._ledgers.pop(guild_id, None)
+        self._indexes.pop(guild_id, None)
+        self._last_used.pop(guild_id, None)
+        return True
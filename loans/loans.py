@@ -1,6 +1,13 @@
 # Standard Library
+import asyncio
 import typing
 import calendar
+import logging
+import time
+import zlib
+import os
+import tempfile
+from datetime import datetime
 from math import ceil
 from math import floor
 
@@ -8,19 +15,31 @@ from math import floor
 from redbot.core import bank
 from redbot.core import commands
 from redbot.core import Config
+from redbot.core.data_manager import cog_data_path
 from redbot.core.utils.predicates import ReactionPredicate
 from redbot.core.utils.menus import start_adding_reactions
 from redbot.core.utils.chat_formatting import box
-from redbot.core.utils.menus import close_menu, menu, DEFAULT_CONTROLS
 from redbot.core.errors import BalanceTooHigh
 
 # Discord 
 import discord
 
-# Other
-import prettytable
-from prettytable import PrettyTable
+# Local
+from . import export as ledger_files
+from . import interest as interest_engine
+from . import journal as events
+from . import settle as settle_engine
+from .journal import LoanJournal
+from .ledger import LedgerCache
+from .ledger import LOAN_GROUP
+from .names import NameCache
+from .pages import LazyPages
+from .pages import page_menu
+from .render import describe_event
+from .render import LedgerTable
+from .render import PAGE_SIZE
 
+log = logging.getLogger("red.remcogs.loans")
 
 class Loanshark(commands.Cog):
 
@@ -28,9 +47,69 @@ class Loanshark(commands.Cog):
         self.bot = bot
         self.config = Config.get_conf(self, identifier=14)
         default_loan_data = {
+            # only read to move old ledgers into LOAN_GROUP, see LedgerCache
             "loans": {},
+            "interest_mode": interest_engine.COMPOUND,
         }
         self.config.register_guild(**default_loan_data)
+        self.config.register_global(accrual_hour=0)
+        self.config.register_member(last_name=None)
+        self.config.init_custom(LOAN_GROUP, 3)
+        self.ledgers = LedgerCache(self.config)
+        self.journal = LoanJournal(str(cog_data_path(self) / "journal"))
+        self.names = NameCache(self.config)
+        self.accrual_task = asyncio.create_task(self.accrual_loop())
+
+    def cog_unload(self):
+        self.accrual_task.cancel()
+        asyncio.create_task(self.ledgers.flush())
+
+    # Applies a day's interest to every guild's loans once a day, so reads never have to write
+    async def accrual_loop(self):
+        await self.bot.wait_until_ready()
+        while True:
+            hour = await self.config.accrual_hour()
+            now = time.time()
+            next_run = floor(now / 60 / 60 / 24) * 60 * 60 * 24 + hour * 60 * 60
+            if next_run <= now:
+                next_run += 60 * 60 * 24
+            await asyncio.sleep(next_run - now)
+            try:
+                await self.accrue_all_guilds()
+            except Exception:
+                log.exception("Nightly interest accrual failed")
+
+    async def accrue_all_guilds(self, concurrency=5):
+        cur_day = floor(time.time() / 60 / 60 / 24)
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def accrue_guild(guild):
+            async with semaphore:
+                async with self.ledgers.lock(guild):
+                    await self.accrue_ledger(guild, cur_day)
+        
+        # guilds the bot's left can't be shown their loans, so there's no point accruing them
+        await asyncio.gather(*(accrue_guild(guild) for guild in self.bot.guilds))
+
+    # Rebases every interest bearing loan in the guild to cur_day and saves the ledger once, without caching a guild that isn't already
+    async def accrue_ledger(self, guild: discord.Guild, cur_day: int):
+        ledger = await self.ledgers.peek(guild)
+        mode = await self.config.guild(guild).interest_mode()
+        loans = [loan0 for loan_dict in ledger.values() for loan0 in loan_dict.values() if loan0 is not None and loan0.get("interest")]
+        if len(loans)==0:
+            return
+        owed = interest_engine.balances(
+            [loan0["outstanding"] for loan0 in loans],
+            [min(1000,max(0,loan0["interest"])) for loan0 in loans],
+            [loan0.get("interest_calc_day") for loan0 in loans],
+            cur_day,
+            mode,
+        )
+        for loan0, outstanding in zip(loans, owed):
+            loan0["outstanding"] = outstanding
+            loan0["interest_calc_day"] = cur_day
+        await self.ledgers.save_peeked(guild, ledger)
+        await self.journal_event(guild.id, events.ACCRUE, ledger, day=cur_day, loans=[[loan0["loaner"], loan0["loanee"], loan0["outstanding"]] for loan0 in loans])
 
     @commands.guild_only()
     @commands.group(name="loan", aliases=['loans'])
@@ -48,9 +127,6 @@ class Loanshark(commands.Cog):
             - `[p]loan give user amount interest` - Loans 'amount' to 'user', with an interest rate of 'interest'
         """
         
-        
-        loans = await self.config.guild(ctx.guild).loans()
-        
         if await bank.can_spend(ctx.author, amount):
             
             interest_txt = ""
@@ -66,13 +142,20 @@ class Loanshark(commands.Cog):
             await ctx.bot.wait_for("reaction_add", check=pred)
             if pred.result is True:
                 await loan_offer.delete()
-                await ctx.send(ctx.author.mention+" loans "+str(amount)+" "+str(await bank.get_currency_name(ctx.guild))+interest_txt+" to "+user.mention)
+                curr_name = str(await bank.get_currency_name(ctx.guild))
                 try:
-                    await self.record_loan(ctx, ctx.author, user, amount, interest)
-                    await bank.withdraw_credits(ctx.author, amount)
-                    await bank.deposit_credits(user, amount)
-                except BalanceTooHigh as e:
-                    await bank.set_balance(user, e.max_balance)
+                    async with self.ledgers.transaction(ctx.guild, str(ctx.author.id), str(user.id)):
+                        # they might have spent it while we waited for an answer
+                        if not await bank.can_spend(ctx.author, amount):
+                            await ctx.send(ctx.author.mention+" you can't afford that much!")
+                            return
+                        event = await self.record_loan(ctx, ctx.author, user, amount, interest)
+                        await self.move_credits(ctx.author, user, amount)
+                        await self.log_loan(ctx, event, ctx.author, user, amount)
+                except BalanceTooHigh:
+                    await ctx.send(user.mention+" can't hold that much "+curr_name+", the loan's off!")
+                    return
+                await ctx.send(ctx.author.mention+" loans "+str(amount)+" "+curr_name+interest_txt+" to "+user.mention)
             else:
                 await loan_offer.delete()
         else:
@@ -89,37 +172,43 @@ class Loanshark(commands.Cog):
             - `[p]loan repay user repayment` - Attempts to repay the specified amount.
         """
     
-        loan = await self.get_loan(ctx, user, ctx.author)
-        if loan is None:
-            await ctx.send("You don't owe "+user.display_name+" any "+str(await bank.get_currency_name(ctx.guild)))
-            return
-    
-        repaying = await loan.get_outstanding()
-        if repayment is not None:
-            repaying = min(repaying, repayment)
-        
-        if await bank.can_spend(ctx.author, repaying):
-            await ctx.send(ctx.author.mention+" repays "+str(repaying)+" "+str(await bank.get_currency_name(ctx.guild))+" to "+user.mention)
-            try:       
+        curr_name = str(await bank.get_currency_name(ctx.guild))
+        try:
+            async with self.ledgers.transaction(ctx.guild, str(user.id), str(ctx.author.id)):
+                loan = await self.get_loan(ctx, user, ctx.author)
+                if loan is None:
+                    await ctx.send("You don't owe "+user.display_name+" any "+curr_name)
+                    return
+            
+                repaying = await loan.get_outstanding()
+                if repayment is not None:
+                    repaying = min(repaying, repayment)
+                
+                if not await bank.can_spend(ctx.author, repaying):
+                    await ctx.send(ctx.author.mention+" you can't afford that much!")
+                    return
                 await loan.repay(repaying) 
-                await bank.withdraw_credits(ctx.author, repaying)
-                await bank.deposit_credits(user, repaying)
-            except BalanceTooHigh as e:
-                await bank.set_balance(user, e.max_balance)
-        else:
-            await ctx.send(ctx.author.mention+" you can't afford that much!")
+                await self.move_credits(ctx.author, user, repaying)
+                await self.log_loan(ctx, events.REPAY, user, ctx.author, repaying)
+        except BalanceTooHigh:
+            await ctx.send(user.mention+" can't hold that much "+curr_name+", try repaying less!")
+            return
+        await ctx.send(ctx.author.mention+" repays "+str(repaying)+" "+curr_name+" to "+user.mention)
 
     @commands.guild_only()
     @_loan.command()
     async def forgive(self, ctx: commands.Context, user: discord.Member):
         """Forgive the debt you're owed..."""
         
-        loan = await self.get_loan(ctx, ctx.author, user)
-        if loan is not None:
-            await ctx.send(ctx.author.mention+" forgives a debt of "+str(await loan.get_outstanding())+" "+str(await bank.get_currency_name(ctx.guild))+" from "+user.mention+"!")
-            await loan.clear_loan()         
-        else:
-            await ctx.send(user.display_name+" doesn't owe you any "+str(await bank.get_currency_name(ctx.guild))+"!")
+        async with self.ledgers.transaction(ctx.guild, str(ctx.author.id), str(user.id)):
+            loan = await self.get_loan(ctx, ctx.author, user)
+            if loan is not None:
+                forgiven = await loan.get_outstanding()
+                await ctx.send(ctx.author.mention+" forgives a debt of "+str(forgiven)+" "+str(await bank.get_currency_name(ctx.guild))+" from "+user.mention+"!")
+                await loan.clear_loan()         
+                await self.log_loan(ctx, events.FORGIVE, ctx.author, user, forgiven)
+            else:
+                await ctx.send(user.display_name+" doesn't owe you any "+str(await bank.get_currency_name(ctx.guild))+"!")
         
 
     @commands.guild_only()        
@@ -137,7 +226,6 @@ class Loanshark(commands.Cog):
             loans_for = user
             
         loans = await self.list_loans(ctx, loans_for)  
-        loans.sort(key=lambda x: x.get_loanee().display_name)
         
         if len(loans)==0:
             whom = "You have"
@@ -146,72 +234,8 @@ class Loanshark(commands.Cog):
             await ctx.send(whom+" no loans!")
             return
             
-        has_interest = False
-        for i, loan in enumerate(loans):
-            if not has_interest and loan.interest is not None:
-                has_interest = True
-                break
-                
-        embed_requested = await ctx.embed_requested()
-        base_embed = discord.Embed()       
-        base_embed.set_author(name=loans_for.display_name+"'s Loans", icon_url=loans_for.avatar_url)
-        
-        amount_col_title = "Initial" if has_interest else "Amount"
-        field_names = ["#", "Loanee", amount_col_title]
-        if has_interest:
-            field_names.append("Interest")
-            field_names.append("Outstanding")
-        
-        base_table = PrettyTable(field_names=field_names)
-        base_table.set_style(prettytable.PLAIN_COLUMNS)
-        base_table.right_padding_width = 2
-        base_table.align = "l"
-        base_table.align[amount_col_title] = "r"
-        if has_interest:
-            base_table.align["Interest"]    = "r"
-            base_table.align["Outstanding"] = "r"
-
-        temp_table = base_table.copy()
-        pages = []
-        
-        def make_embed():
-            nonlocal temp_table, pages
-            msg = temp_table.get_string()
-            
-            if(embed_requested):
-                embed = base_embed.copy()
-                embed.description = box(msg, lang="md")
-                embed.set_footer(text=f"Page {len(pages)+1}/{ceil(len(loans)/10)}")
-                pages.append(embed)
-            else:
-                pages.append(box(msg, lang="md"))
-            
-            temp_table = base_table.copy()
-        
-        for i, loan in enumerate(loans,start=1):
-            loanee = loan.get_loanee()
-            
-            interest0 = loan.interest
-            if interest0 is None:
-                interest0 = 0
-            interest = str(interest0)+"%"
-            
-            if has_interest:
-                temp_table.add_row([f"{i}.", loanee.display_name, loan.get_initial_amount(), interest, await loan.get_outstanding()])
-            else:
-                temp_table.add_row([f"{i}.", loanee.display_name, loan.get_initial_amount()])
-            
-            if i % 10 == 0:
-                make_embed()
-        
-        if(len(pages) != ceil(len(loans)/10)):
-            make_embed()
-        
-        await menu(
-            ctx,
-            pages,
-            DEFAULT_CONTROLS if len(pages) > 1 else {"\N{CROSS MARK}": close_menu},
-        )
+        total = (await self.ledgers.index(ctx.guild)).lent.get(str(loans_for.id), 0)
+        await self.show_ledger(ctx, loans, loans_for.display_name+"'s Loans", loans_for.avatar_url, ("loanee",), total)
 
     @commands.guild_only()
     @_loan.command(aliases=["debts"])
@@ -228,7 +252,6 @@ class Loanshark(commands.Cog):
             loans_for = user
             
         loans = await self.list_debts(ctx, loans_for)  
-        loans.sort(key=lambda x: x.get_loanee().display_name)
         
         if len(loans)==0:
             whom = "You have"
@@ -237,72 +260,8 @@ class Loanshark(commands.Cog):
             await ctx.send(whom+" no debts!")
             return
             
-        has_interest = False
-        for i, loan in enumerate(loans):
-            if not has_interest and loan.interest is not None:
-                has_interest = True
-                break
-                
-        embed_requested = await ctx.embed_requested()
-        base_embed = discord.Embed()       
-        base_embed.set_author(name=loans_for.display_name+"'s Debts", icon_url=loans_for.avatar_url)
-        
-        amount_col_title = "Initial" if has_interest else "Amount"
-        field_names = ["#", "Loaner", amount_col_title]
-        if has_interest:
-            field_names.append("Interest")
-            field_names.append("Outstanding")
-        
-        base_table = PrettyTable(field_names=field_names)
-        base_table.set_style(prettytable.PLAIN_COLUMNS)
-        base_table.right_padding_width = 2
-        base_table.align = "l"
-        base_table.align[amount_col_title] = "r"
-        if has_interest:
-            base_table.align["Interest"]    = "r"
-            base_table.align["Outstanding"] = "r"
-
-        temp_table = base_table.copy()
-        pages = []
-        
-        def make_embed():
-            nonlocal temp_table, pages
-            msg = temp_table.get_string()
-
-            if(embed_requested):
-                embed = base_embed.copy()
-                embed.description = box(msg, lang="md")
-                embed.set_footer(text=f"Page {len(pages)+1}/{ceil(len(loans)/10)}")
-                pages.append(embed)
-            else:
-                pages.append(box(msg, lang="md"))
-            
-            temp_table = base_table.copy()
-        
-        for i, loan in enumerate(loans,start=1):
-            loaner = loan.get_loaner()
-            
-            interest0 = loan.interest
-            if interest0 is None:
-                interest0 = 0
-            interest = str(interest0)+"%"
-            
-            if has_interest:
-                temp_table.add_row([f"{i}.", loaner.display_name, loan.get_initial_amount(), interest, await loan.get_outstanding()])
-            else:
-                temp_table.add_row([f"{i}.", loaner.display_name, loan.get_initial_amount()])
-            
-            if i % 10 == 0:
-                make_embed()
-        
-        if(len(pages) != ceil(len(loans)/10)):
-            make_embed()
-                
-        await menu(
-            ctx,
-            pages,
-            DEFAULT_CONTROLS if len(pages) > 1 else {"\N{CROSS MARK}": close_menu},
-        )
+        total = (await self.ledgers.index(ctx.guild)).owed.get(str(loans_for.id), 0)
+        await self.show_ledger(ctx, loans, loans_for.display_name+"'s Debts", loans_for.avatar_url, ("loaner",), total)
 
     @commands.guild_only()        
     @_loan.command()
@@ -310,81 +269,285 @@ class Loanshark(commands.Cog):
         """Who owes who what?"""
     
         loans = await self.list_all_loans(ctx)
-        loans.sort(key=lambda x: x.get_loanee().display_name)
         
         if len(loans)==0:      
             await ctx.send("Nobody has any loans!")
             return
             
-        has_interest = False
-        for i, loan in enumerate(loans):
-            if not has_interest and loan.interest is not None:
-                has_interest = True
-                break
-                
+        await self.show_ledger(ctx, loans, ctx.guild.name+" - Loans", ctx.guild.icon_url, ("loaner", "loanee"))
+
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    @_loan.command()
+    async def settle(self, ctx: commands.Context):
+        """Boil the server's interest free loans down to as few as possible.
+        
+        Loans going both ways cancel out and circles of debt disappear, but
+        everyone's still owed and owes the same in total. Interest bearing
+        loans are left alone. Shows what would change and asks before doing it.
+        
+        Examples:
+            - `[p]loan settle` - Previews the settlement, react to apply it.
+        """
+        
+        settlement = settle_engine.plan(await self.ledgers.get(ctx.guild))
+        if not settlement.changes:
+            await ctx.send("There's nothing to settle!")
+            return
+        
+        new_loans = sorted(
+            (Loan(ctx, self.ledgers, {"outstanding": amount, "interest": None, "loaner": loaner_key, "loanee": loanee_key}) for (loaner_key, loanee_key), amount in settlement.transfers.items()),
+            key=lambda loan: loan.outstanding,
+            reverse=True,
+        )
+        preview = new_loans[:PAGE_SIZE]
+        table = LedgerTable(("loaner", "loanee"), False).render(preview, await self.resolve_names(ctx.guild, preview))
+        more = ""
+        if len(new_loans) > len(preview):
+            more = "\n...and "+str(len(new_loans)-len(preview))+" more"
+        
+        offer = await ctx.send(
+            "Settling would turn "+str(len(settlement.replaced))+" interest free loans between "+str(settlement.members)+" members into "+str(len(new_loans))+":"
+            +box(table, lang="md")+more+"\nApply it?"
+        )
+        start_adding_reactions(offer, ReactionPredicate.YES_OR_NO_EMOJIS)
+        pred = ReactionPredicate.yes_or_no(offer, ctx.author)
+        try:
+            await ctx.bot.wait_for("reaction_add", check=pred, timeout=60)
+        except asyncio.TimeoutError:
+            await offer.delete()
+            return
+        await offer.delete()
+        if pred.result is not True:
+            return
+        
+        async with self.ledgers.lock(ctx.guild):
+            # loans might have changed while we waited, settle what's there now
+            ledger = await self.ledgers.get(ctx.guild)
+            settlement = settle_engine.plan(ledger)
+            removed, added = settle_engine.apply(ledger, settlement, await self.ledgers.index(ctx.guild))
+            await self.ledgers.save_all(ctx.guild)
+            await self.journal_event(ctx.guild.id, events.SETTLE, ledger, by=str(ctx.author.id), removed=removed, loans=added)
+        await ctx.send("Settled! "+str(len(settlement.replaced))+" loans became "+str(len(settlement.transfers))+".")
+
+    @commands.guild_only()
+    @_loan.command()
+    async def history(self, ctx: commands.Context, user: typing.Optional[discord.Member]):
+        """Everything that's happened to your loans, newest first.
+        
+        Examples:
+            - `[p]loan history` - Your loans and debts.
+            - `[p]loan history user` - 'user's loans and debts.
+        """
+        
+        history_for = user or ctx.author
+        entries = await ctx.bot.loop.run_in_executor(None, self.journal.history, ctx.guild.id, str(history_for.id))
+        if len(entries)==0:
+            await ctx.send("Nothing's happened to "+history_for.display_name+"'s loans yet!")
+            return
+        
+        names = await self.resolve_keys(ctx.guild, [key for entry in entries for key in events.involved(entry)] + [entry["by"] for entry in entries if "by" in entry])
+        curr_name = str(await bank.get_currency_name(ctx.guild))
         embed_requested = await ctx.embed_requested()
-        base_embed = discord.Embed()       
-        base_embed.set_author(name=ctx.guild.name+" - Loans", icon_url=ctx.guild.icon_url)
-        
-        amount_col_title = "Initial" if has_interest else "Amount"
-        field_names = ["#", "Loaner", "Loanee", amount_col_title]
-        if has_interest:
-            field_names.append("Interest")
-            field_names.append("Outstanding")
-        
-        base_table = PrettyTable(field_names=field_names)
-        base_table.set_style(prettytable.PLAIN_COLUMNS)
-        base_table.right_padding_width = 2
-        base_table.align = "l"
-        base_table.align[amount_col_title] = "r"
-        if has_interest:
-            base_table.align["Interest"]    = "r"
-            base_table.align["Outstanding"] = "r"
-            
-        temp_table = base_table.copy()
-        pages = []
+        page_count = ceil(len(entries)/PAGE_SIZE)
+        
+        async def render_page(page):
+            lines = []
+            for entry in entries[page*PAGE_SIZE:(page+1)*PAGE_SIZE]:
+                when = datetime.utcfromtimestamp(entry["time"]).strftime("%Y-%m-%d %H:%M")
+                lines.append("`"+when+"` "+describe_event(entry, names, curr_name))
+            msg = "\n".join(lines)
+            if(embed_requested):
+                embed = discord.Embed(description=msg)
+                embed.set_author(name=history_for.display_name+"'s Loan History", icon_url=history_for.avatar_url)
+                embed.set_footer(text=f"Page {page+1}/{page_count}")
+                return embed
+            return msg
+        
+        await page_menu(ctx, LazyPages(page_count, render_page))
 
-        def make_embed():
-            nonlocal temp_table, pages
-            msg = temp_table.get_string()
+    @commands.guild_only()
+    @commands.is_owner()
+    @_loan.command()
+    async def rebuild(self, ctx: commands.Context):
+        """Put the server's loans back the way the loan history says they should be.
+        
+        For when saved loans have gone missing or wrong, asks before doing it.
+        """
+        
+        if not self.journal.has_base(ctx.guild.id):
+            await ctx.send("There's no history for "+ctx.guild.name+" to rebuild from yet!")
+            return
+        offer = await ctx.send("This replaces every loan in "+ctx.guild.name+" with the ones rebuilt from its history, are you sure?")
+        start_adding_reactions(offer, ReactionPredicate.YES_OR_NO_EMOJIS)
+        pred = ReactionPredicate.yes_or_no(offer, ctx.author)
+        try:
+            await ctx.bot.wait_for("reaction_add", check=pred, timeout=60)
+        except asyncio.TimeoutError:
+            await offer.delete()
+            return
+        await offer.delete()
+        if pred.result is not True:
+            return
+        
+        async with self.ledgers.lock(ctx.guild):
+            ledger = await ctx.bot.loop.run_in_executor(None, self.journal.replay, ctx.guild.id)
+            await self.ledgers.replace(ctx.guild, ledger)
+        await ctx.send("Rebuilt "+str(sum(len(loan_dict) for loan_dict in ledger.values()))+" loans from history.")
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    @_loan.command()
+    async def export(self, ctx: commands.Context, file_format: typing.Optional[str] = ledger_files.CSV):
+        """Download every loan in the server as a file.
+        
+        Examples:
+            - `[p]loan export` - A CSV file, one loan per line.
+            - `[p]loan export bin` - A smaller compressed file, for big ledgers.
+        """
+        
+        file_format = file_format.lower()
+        if file_format not in ledger_files.FORMATS:
+            await ctx.send("Format must be one of: "+", ".join(ledger_files.FORMATS))
+            return
+        path = self.export_path(ctx.guild, file_format)
+        try:
+            async with self.ledgers.lock(ctx.guild):
+                ledger = await self.ledgers.get(ctx.guild)
+                count = await ctx.bot.loop.run_in_executor(None, ledger_files.write, path, ledger_files.ledger_loans(ledger), file_format)
+            try:
+                await ctx.send(str(count)+" loans from "+ctx.guild.name, file=discord.File(path, filename=str(ctx.guild.id)+"-loans."+file_format))
+            except discord.HTTPException:
+                await ctx.send("That file's too big to upload here, try `"+ctx.clean_prefix+"loan export bin`.")
+        finally:
+            os.remove(path)
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    @_loan.command(name="import")
+    async def _import(self, ctx: commands.Context, replace: typing.Optional[bool] = False):
+        """Load loans from a file made by `[p]loan export`, attach it to the command.
+        
+        Loans in the file take the place of any between the same people.
+        
+        Examples:
+            - `[p]loan import` - Adds the attached file's loans to the server's.
+            - `[p]loan import yes` - Clears the server's loans first.
+        """
+        
+        if len(ctx.message.attachments)==0:
+            await ctx.send("Attach a file from `"+ctx.clean_prefix+"loan export` to import it.")
+            return
+        path = self.export_path(ctx.guild, "import")
+        try:
+            await ctx.message.attachments[0].save(path)
+            # read through once first, so a bad file changes nothing
+            await ctx.bot.loop.run_in_executor(None, ledger_files.check, path)
+            async with self.ledgers.lock(ctx.guild):
+                ledger = {} if replace else await self.ledgers.get(ctx.guild)
+                index = None if replace else await self.ledgers.index(ctx.guild)
+                count = 0
+                # then merge it a chunk at a time, read off the event loop
+                chunks = ledger_files.chunks(ledger_files.read(path))
+                while True:
+                    chunk = await ctx.bot.loop.run_in_executor(None, next, chunks, None)
+                    if chunk is None:
+                        break
+                    for loan0 in chunk:
+                        ledger.setdefault(loan0["loaner"], {})[loan0["loanee"]] = loan0
+                        if index is not None:
+                            index.put(loan0)
+                    count += len(chunk)
+                if replace:
+                    await self.ledgers.replace(ctx.guild, ledger)
+                else:
+                    await self.ledgers.save_all(ctx.guild)
+                await self.journal_event(ctx.guild.id, events.IMPORT, ledger, snapshot=True, by=str(ctx.author.id), count=count, replace=bool(replace))
+        except (ValueError, UnicodeDecodeError, zlib.error) as e:
+            await ctx.send("Couldn't import that file: "+str(e))
+            return
+        finally:
+            os.remove(path)
+        await ctx.send("Imported "+str(count)+" loans!")
+
+    # A new file for every export or import, so two running at once in a guild never share one
+    def export_path(self, guild: discord.Guild, suffix: str):
+        fd, path = tempfile.mkstemp(prefix=str(guild.id)+"-loans-", suffix="."+suffix, dir=str(cog_data_path(self)))
+        os.close(fd)
+        return path
+
+    # Moves credits between members, giving the sender their credits back if the deposit fails for any reason
+    async def move_credits(self, sender: discord.Member, receiver: discord.Member, amount: int):
+        await bank.withdraw_credits(sender, amount)
+        try:
+            await bank.deposit_credits(receiver, amount)
+        except BaseException:
+            await bank.deposit_credits(sender, amount)
+            raise
 
+    # Shared by list, debt and debtboard, total is the member's running total from the ledger index
+    async def show_ledger(self, ctx: commands.Context, loans: typing.List["Loan"], title: str, icon_url, sides: typing.Tuple[str, ...], total: typing.Optional[int] = None):
+        names = await self.resolve_names(ctx.guild, loans)
+        loans.sort(key=lambda x: names[getattr(x, sides[-1]+"_key")])
+        
+        table = LedgerTable(sides, any(loan.interest is not None for loan in loans))
+        embed_requested = await ctx.embed_requested()
+        base_embed = discord.Embed()
+        base_embed.set_author(name=title, icon_url=icon_url)
+        page_count = ceil(len(loans)/PAGE_SIZE)
+        total_txt = ""
+        if total is not None:
+            # stored balances, so today's interest shows up once the nightly accrual has run
+            total_txt = "Total: "+str(total)+" "+str(await bank.get_currency_name(ctx.guild))+" as of the last interest run"
+        
+        async def render_page(page):
+            page_loans = loans[page*PAGE_SIZE:(page+1)*PAGE_SIZE]
+            await self.accrue_loans(ctx, page_loans)
+            msg = table.render(page_loans, names, start=page*PAGE_SIZE+1)
             if(embed_requested):
                 embed = base_embed.copy()
                 embed.description = box(msg, lang="md")
-                embed.set_footer(text=f"Page {len(pages)+1}/{ceil(len(loans)/10)}")
-                pages.append(embed)
-            else:
-                pages.append(box(msg, lang="md"))
-            
-            temp_table = base_table.copy()
+                footer = f"Page {page+1}/{page_count}"
+                if total_txt:
+                    footer += " - "+total_txt
+                embed.set_footer(text=footer)
+                return embed
+            if total_txt:
+                return box(msg, lang="md")+total_txt
+            return box(msg, lang="md")
+        
+        await page_menu(ctx, LazyPages(page_count, render_page))
+    
+    # Display names for everyone in these loans, from the name cache
+    async def resolve_names(self, guild: discord.Guild, loans: typing.List["Loan"]):
+        return await self.resolve_keys(guild, (key for loan in loans for key in (loan.loaner_key, loan.loanee_key)))
 
-        for i, loan in enumerate(loans,start=1):
-            loaner = loan.get_loaner()
-            loanee = loan.get_loanee()
-            amount = loan.get_initial_amount()
-            
-            interest0 = loan.interest
-            if interest0 is None:
-                interest0 = 0
-            interest = str(interest0)+"%"
-            
-            if has_interest:
-                temp_table.add_row([f"{i}.", loaner.display_name, loanee.display_name, loan.get_initial_amount(), interest, await loan.get_outstanding()])
-            else:
-                temp_table.add_row([f"{i}.", loaner.display_name, loanee.display_name, loan.get_initial_amount()])
-            
-            if i % 10 == 0:
-                make_embed()
-        
-        if(len(pages) != ceil(len(loans)/10)):
-            make_embed()
+    async def resolve_keys(self, guild: discord.Guild, keys: typing.Iterable[str]):
+        return await self.names.resolve(guild, keys)
 
-        await menu(
-            ctx,
-            pages,
-            DEFAULT_CONTROLS if len(pages) > 1 else {"\N{CROSS MARK}": close_menu},
-        )
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.display_name != after.display_name:
+            self.names.update(after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        if before.name != after.name:
+            self.names.update_user(after)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        self.names.update(member)
 
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        # one small write, cheaper than looking through the guild's loans to see if it's needed
+        await self.names.remember(member)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.names.forget_guild(guild)
 
     @commands.guild_only()
     @commands.is_owner()
@@ -392,8 +555,58 @@ class Loanshark(commands.Cog):
     async def clear_all_debts(self, ctx):
         """No loan sharks were harmed in the making of this cog."""
     
-        await self.config.clear_all()   
+        # only the loans, settings and saved names stay
+        await self.config.clear_all_custom(LOAN_GROUP)
+        for guild_id, data in (await self.config.all_guilds()).items():
+            if data.get("loans"):
+                await self.config.guild(discord.Object(id=guild_id)).loans.clear()
+        self.ledgers.clear()
+        for guild_id in self.journal.guild_ids():
+            async with self.ledgers.lock(discord.Object(id=guild_id)):
+                await self.journal_event(guild_id, events.CLEAR, {}, by=str(ctx.author.id))
         await ctx.send("Done!")
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    @_loan.command()
+    async def interestmode(self, ctx: commands.Context, mode: typing.Optional[str]):
+        """How interest is worked out in this server.
+        
+        Examples:
+            - `[p]loan interestmode` - Shows the current mode.
+            - `[p]loan interestmode compound` - Interest is charged on interest, daily.
+            - `[p]loan interestmode simple` - Interest is only charged on what was last owed.
+        """
+        
+        if mode is None:
+            await ctx.send("Interest is currently "+await self.config.guild(ctx.guild).interest_mode())
+            return
+        mode = mode.lower()
+        if mode not in interest_engine.MODES:
+            await ctx.send("Interest mode must be one of: "+", ".join(interest_engine.MODES))
+            return
+        await self.config.guild(ctx.guild).interest_mode.set(mode)
+        await ctx.send("Interest is now "+mode)
+
+    @commands.is_owner()
+    @_loan.command()
+    async def accrualhour(self, ctx: commands.Context, hour: typing.Optional[int]):
+        """When each day's interest gets added to every loan.
+        
+        Examples:
+            - `[p]loan accrualhour` - Shows the current hour (UTC).
+            - `[p]loan accrualhour 6` - Adds interest at 06:00 UTC from now on.
+        """
+        
+        if hour is None:
+            await ctx.send("Interest is added at "+str(await self.config.accrual_hour()).zfill(2)+":00 UTC")
+            return
+        hour = min(23,max(0,hour))
+        await self.config.accrual_hour.set(hour)
+        # restart the loop so it sleeps until the new hour
+        self.accrual_task.cancel()
+        self.accrual_task = asyncio.create_task(self.accrual_loop())
+        await ctx.send("Interest will be added at "+str(hour).zfill(2)+":00 UTC")
     
     
     
@@ -401,7 +614,7 @@ class Loanshark(commands.Cog):
     async def record_loan(self, ctx: commands.Context, loaner: discord.Member, loanee: discord.Member, amount: int, interest: typing.Optional[int]):  
         loaner_key = str(loaner.id)
         loanee_key = str(loanee.id)
-        loans = await self.config.guild(ctx.guild).loans()
+        loans = await self.ledgers.get(ctx.guild)
         if loans.get(loaner_key) is None:
             loans[loaner_key] = {}
         if loans.get(loaner_key).get(loanee_key) is None:
@@ -413,6 +626,11 @@ class Loanshark(commands.Cog):
         if current_loan is None:
             loans[loaner_key][loanee_key] = {"original_amount": amount, "outstanding": amount, "interest": interest, "loaner": loaner_key, "loanee": loanee_key}
         else:
+            # bring the old balance up to today before extending it
+            loan = Loan(ctx, self.ledgers, current_loan)
+            loan.accrue(loan.current_day(), await self.config.guild(ctx.guild).interest_mode())
+            loan.rebase(loan.current_day())
+
             curr_name = str(await bank.get_currency_name(ctx.guild))   
             curr_amount = loans[loaner_key][loanee_key]["outstanding"] 
             loans[loaner_key][loanee_key]["outstanding"] += amount
@@ -430,52 +648,84 @@ class Loanshark(commands.Cog):
                     
             await ctx.send(loan_update_msg)
                 
-        await self.config.guild(ctx.guild).loans.set(loans)
+        (await self.ledgers.index(ctx.guild)).put(loans[loaner_key][loanee_key])
+        await self.ledgers.save(ctx.guild, loaner_key, loanee_key)
+        return events.GIVE if current_loan is None else events.EXTEND
+
+    # Journals a change to one loan, with the loan as it's been left
+    async def log_loan(self, ctx: commands.Context, event: str, loaner: discord.Member, loanee: discord.Member, amount: int):
+        loaner_key = str(loaner.id)
+        loanee_key = str(loanee.id)
+        ledger = await self.ledgers.get(ctx.guild)
+        loan0 = ledger.get(loaner_key, {}).get(loanee_key)
+        await self.journal_event(ctx.guild.id, event, ledger, by=str(ctx.author.id), loaner=loaner_key, loanee=loanee_key, amount=amount, loan=loan0)
+
+    # The change it records has already been made and money may have moved, so a journal that can't be written is only logged
+    async def journal_event(self, guild_id: int, event: str, ledger: dict, snapshot: bool = False, **fields):
+        try:
+            await self.journal.append(guild_id, event, ledger, **fields)
+            if snapshot:
+                await self.journal.snapshot(guild_id, ledger)
+        except Exception:
+            log.exception("Couldn't journal a %s event for guild %s", event, guild_id)
 
     # Loans where we are the loaner
     async def list_loans(self, ctx: commands.Context, loaner: discord.Member):
-        ret = []
-        for i, loan in enumerate(await self.list_all_loans(ctx)):
-            if loan.loaner_key==str(loaner.id):
-                ret.append(loan)
-        return ret
+        loans = await self.ledgers.get(ctx.guild)
+        loan_dict = loans.get(str(loaner.id), {})
+        return [Loan(ctx, self.ledgers, loan0) for loan0 in loan_dict.values() if loan0 is not None]
     
     # Loans where we are the loanee
     async def list_debts(self, ctx: commands.Context, loanee: discord.Member):
-        ret = []      
-        for i, loan in enumerate(await self.list_all_loans(ctx)):
-            if loan.loanee_key==str(loanee.id):
-                ret.append(loan)
-        return ret
+        loans = await self.ledgers.get(ctx.guild)
+        index = await self.ledgers.index(ctx.guild)
+        loanee_key = str(loanee.id)
+        return [Loan(ctx, self.ledgers, loans[loaner_key][loanee_key]) for loaner_key in index.loaners_of(loanee_key)]
     
     # Get Loaner's loan to Loanee
     async def get_loan(self, ctx: commands.Context, loaner: discord.Member, loanee: discord.Member):
-        loans = await self.config.guild(ctx.guild).loans()      
+        loans = await self.ledgers.get(ctx.guild)
         loaner_key = str(loaner.id)
         loanee_key = str(loanee.id)
         if loans.get(loaner_key):
             loan_dict = loans[loaner_key]
             if loan_dict.get(loanee_key):
-                return Loan(ctx, self.config, loan_dict[loanee_key])
+                return Loan(ctx, self.ledgers, loan_dict[loanee_key])
         return None
         
     # All loans as a list
     async def list_all_loans(self, ctx: commands.Context):
-        loans = await self.config.guild(ctx.guild).loans()
+        loans = await self.ledgers.get(ctx.guild)
         ret = []
         for i, loaner in enumerate(loans.keys()):
             loan_dict = loans[loaner]     
             for i, loanee in enumerate(loan_dict.keys()):
-                ret.append(Loan(ctx, self.config, loan_dict[loanee]))
+                ret.append(Loan(ctx, self.ledgers, loan_dict[loanee]))
         return ret
 
+    # Works out every loan's balance as of today in one pass, doesn't save anything
+    async def accrue_loans(self, ctx: commands.Context, loans: typing.List["Loan"]):
+        if len(loans)==0:
+            return
+        cur_day = loans[0].current_day()
+        mode = await self.config.guild(ctx.guild).interest_mode()
+        owed = interest_engine.balances(
+            [loan.loan0["outstanding"] for loan in loans],
+            [loan.interest for loan in loans],
+            [loan.interest_calc_day for loan in loans],
+            cur_day,
+            mode,
+        )
+        for loan, outstanding in zip(loans, owed):
+            loan.outstanding = outstanding
+
 
 
 
 class Loan():
-    def __init__(self, ctx, config, loan0):
+    def __init__(self, ctx, ledgers, loan0):
         self.ctx = ctx
-        self.config = config
+        self.ledgers = ledgers
         self.loan0 = loan0
         
         self.loaner_key      = loan0["loaner"]
@@ -494,38 +744,33 @@ class Loan():
         if loan0.get("interest"):
             self.interest = min(1000,max(0,loan0["interest"]))
             
-    def get_loaner(self):
-       return self.ctx.guild.get_member(int(self.loaner_key))
-        
-    def get_loanee(self):
-        return self.ctx.guild.get_member(int(self.loanee_key))
-
     def get_initial_amount(self):
         return self.original_amount
 
-    async def get_outstanding(self):
+    def current_day(self):
         cur_time = calendar.timegm(self.ctx.message.created_at.utctimetuple()) 
-        cur_day  = floor(cur_time / 60 / 60 / 24)
+        return floor(cur_time / 60 / 60 / 24)
 
-        # already added today's interest
-        if cur_day == self.interest_calc_day:
-            return self.outstanding
+    # Works out the balance as of cur_day, the nightly accrual is what saves it
+    def accrue(self, cur_day, mode=interest_engine.COMPOUND):
         if self.interest is None:
-            return self.outstanding
-            
+            return
+        
         days = 1
         if self.interest_calc_day is not None:
-            days = max(1,cur_day - self.interest_calc_day)
-              
+            days = cur_day - self.interest_calc_day
+        
+        self.outstanding = interest_engine.balance(self.loan0["outstanding"], self.interest, days, mode)
+    
+    # Makes the current balance the one future interest is worked out from
+    def rebase(self, cur_day):
         self.interest_calc_day = cur_day
-        self.outstanding += ceil((self.outstanding * (self.interest/100)) * days)
         self.loan0["interest_calc_day"] = cur_day
         self.loan0["outstanding"] = self.outstanding
-        
-        loans = await self.config.guild(self.ctx.guild).loans()
-        loans[self.loaner_key][self.loanee_key] = self.loan0
-        await self.config.guild(self.ctx.guild).loans.set(loans)
-        
+
+    async def get_outstanding(self):
+        mode = await self.ledgers.config.guild(self.ctx.guild).interest_mode()
+        self.accrue(self.current_day(), mode)
         return self.outstanding
 
     async def repay(self, amount):    
@@ -534,15 +779,18 @@ class Loan():
         if curr_outstanding <= 0:
             await self.clear_loan()
         else:
-            self.loan0["outstanding"] = curr_outstanding
-            loans = await self.config.guild(self.ctx.guild).loans()
+            self.outstanding = curr_outstanding
+            self.rebase(self.current_day())
+            loans = await self.ledgers.get(self.ctx.guild)
             loans[self.loaner_key][self.loanee_key] = self.loan0
-            await self.config.guild(self.ctx.guild).loans.set(loans)
+            (await self.ledgers.index(self.ctx.guild)).put(self.loan0)
+            await self.ledgers.save(self.ctx.guild, self.loaner_key, self.loanee_key)
             
             
     
     async def clear_loan(self):
-        loans = await self.config.guild(self.ctx.guild).loans() 
+        loans = await self.ledgers.get(self.ctx.guild)
         loans[self.loaner_key].pop(self.loanee_key, None)
-        await self.config.guild(self.ctx.guild).loans.set(loans)
+        (await self.ledgers.index(self.ctx.guild)).discard(self.loaner_key, self.loanee_key)
+        await self.ledgers.save(self.ctx.guild, self.loaner_key, self.loanee_key)
         
\ No newline at end of file
@@ -0,0 +1,57 @@
+UNKNOWN = "Unknown"
+
+
+class NameCache():
+    """Display names for the people in loan tables, per guild.
+
+    A ledger's names are resolved in one batch and then kept, the cog's
+    member listeners keep them up to date as people rename, leave or
+    rejoin. When someone leaves, their last display name is saved to
+    Config as the member's last_name, so their loans still show a name
+    after they've gone, even across restarts.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._names = {}
+
+    async def resolve(self, guild, keys):
+        """{member key: display name} for every key, looking up each one at most once."""
+        names = self._names.setdefault(guild.id, {})
+        keys = set(keys)
+        departed = []
+        for key in keys:
+            if key in names:
+                continue
+            member = guild.get_member(int(key))
+            if member is not None:
+                names[key] = member.display_name
+            else:
+                departed.append(key)
+        if departed:
+            stored = await self.config.all_members(guild)
+            for key in departed:
+                names[key] = stored.get(int(key), {}).get("last_name") or UNKNOWN
+        return {key: names[key] for key in keys}
+
+    def update(self, member):
+        names = self._names.get(member.guild.id)
+        if names is not None and str(member.id) in names:
+            names[str(member.id)] = member.display_name
+
+    def update_user(self, user):
+        """Usernames are shown for members without a nickname, in every guild."""
+        key = str(user.id)
+        for names in self._names.values():
+            if key in names:
+                del names[key]
+
+    async def remember(self, member):
+        """Saves a departing member's name, for their loans to keep showing."""
+        await self.config.member(member).last_name.set(member.display_name)
+        names = self._names.get(member.guild.id)
+        if names is not None:
+            names[str(member.id)] = member.display_name
+
+    def forget_guild(self, guild):
+        self._names.pop(guild.id, None)
@@ -0,0 +1,86 @@
+# Standard Library
+import asyncio
+from collections import OrderedDict
+
+# Red
+from redbot.core.utils.menus import start_adding_reactions
+from redbot.core.utils.predicates import ReactionPredicate
+
+# Discord
+import discord
+
+PREV_PAGE = "\N{LEFTWARDS BLACK ARROW}"
+CLOSE     = "\N{CROSS MARK}"
+NEXT_PAGE = "\N{BLACK RIGHTWARDS ARROW}"
+
+
+class LazyPages():
+    """Pages of a menu that are only rendered when somebody navigates to them.
+
+    `render` is an async callable taking a page number and returning a str or
+    discord.Embed. The last few rendered pages are kept so flicking back and
+    forth doesn't render them again.
+    """
+
+    def __init__(self, count, render, cache_size=5):
+        self.count = count
+        self.render = render
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return self.count
+
+    async def get(self, page):
+        if page in self._cache:
+            self._cache.move_to_end(page)
+            return self._cache[page]
+        rendered = await self.render(page)
+        self._cache[page] = rendered
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return rendered
+
+
+# Same controls as redbot's menu(), which can't be used here as it looks at every page up front
+async def page_menu(ctx, pages: LazyPages, timeout: float = 30.0):
+    emojis = [PREV_PAGE, CLOSE, NEXT_PAGE] if len(pages) > 1 else [CLOSE]
+    page = 0
+    current = await pages.get(page)
+    if isinstance(current, discord.Embed):
+        message = await ctx.send(embed=current)
+    else:
+        message = await ctx.send(current)
+    start_adding_reactions(message, emojis)
+
+    while True:
+        pred = ReactionPredicate.with_emojis(emojis, message, ctx.author)
+        try:
+            await ctx.bot.wait_for("reaction_add", check=pred, timeout=timeout)
+        except asyncio.TimeoutError:
+            try:
+                await message.clear_reactions()
+            except (discord.Forbidden, discord.NotFound):
+                pass
+            return message
+
+        emoji = emojis[pred.result]
+        if emoji == CLOSE:
+            try:
+                await message.delete()
+            except discord.NotFound:
+                pass
+            return None
+
+        try:
+            await message.remove_reaction(emoji, ctx.author)
+        except (discord.Forbidden, discord.NotFound):
+            pass
+
+        step = 1 if emoji == NEXT_PAGE else -1
+        page = (page + step) % len(pages)
+        current = await pages.get(page)
+        if isinstance(current, discord.Embed):
+            await message.edit(embed=current)
+        else:
+            await message.edit(content=current)
@@ -0,0 +1,99 @@
+# Local
+from .journal import ACCRUE
+from .journal import CLEAR
+from .journal import EXTEND
+from .journal import FORGIVE
+from .journal import GIVE
+from .journal import IMPORT
+from .journal import REPAY
+from .journal import SETTLE
+
+PAGE_SIZE = 10
+
+
+def format_table(field_names, rows, align, padding=2):
+    """Lays rows out in fixed width plain columns, like PrettyTable's PLAIN_COLUMNS.
+
+    `align` has an "l" or "r" per column. Every cell is followed by `padding`
+    spaces, trailing whitespace on a line is trimmed.
+    """
+    cells = [[str(value) for value in row] for row in rows]
+    widths = [len(name) for name in field_names]
+    for row in cells:
+        for col, value in enumerate(row):
+            if len(value) > widths[col]:
+                widths[col] = len(value)
+
+    gap = " " * padding
+    lines = []
+    for row in [field_names] + cells:
+        line = gap.join(value.rjust(widths[col]) if align[col] == "r" else value.ljust(widths[col]) for col, value in enumerate(row))
+        lines.append(line.rstrip())
+    return "\n".join(lines)
+
+
+class LedgerTable():
+    """Renders pages of loans as the tables used by list, debt and debtboard.
+
+    `sides` is which people to show: ("loanee",), ("loaner",) or both. Names
+    come from a key -> display name mapping worked out once by the caller,
+    loans only need loaner_key, loanee_key, interest, original_amount and
+    outstanding.
+    """
+
+    def __init__(self, sides, has_interest):
+        self.sides = sides
+        self.has_interest = has_interest
+        amount_col_title = "Initial" if has_interest else "Amount"
+
+        self.field_names = ["#"] + [side.capitalize() for side in sides] + [amount_col_title]
+        self.align = ["l"] * (1 + len(sides)) + ["r"]
+        if has_interest:
+            self.field_names += ["Interest", "Outstanding"]
+            self.align += ["r", "r"]
+
+    def row(self, number, loan, names):
+        row = [f"{number}."]
+        for side in self.sides:
+            row.append(names[getattr(loan, side+"_key")])
+        row.append(loan.original_amount)
+        if self.has_interest:
+            row.append(str(loan.interest or 0)+"%")
+            row.append(loan.outstanding)
+        return row
+
+    def render(self, loans, names, start=1):
+        rows = [self.row(i, loan, names) for i, loan in enumerate(loans, start=start)]
+        return format_table(self.field_names, rows, self.align)
+
+
+def describe_event(entry, names, currency):
+    """One line about a loan journal entry, for [p]loan history."""
+    event = entry["event"]
+    if event == CLEAR:
+        return "Every loan was cleared"
+    if event == ACCRUE:
+        return "Interest was added to "+str(len(entry["loans"]))+" loans"
+    if event == IMPORT:
+        return names[entry["by"]]+" imported "+str(entry["count"])+" loans"
+    if event == SETTLE:
+        return names[entry["by"]]+" settled "+str(len(entry["removed"]))+" loans into "+str(len(entry["loans"]))
+
+    loaner = names[entry["loaner"]]
+    loanee = names[entry["loanee"]]
+    amount = str(entry["amount"])+" "+currency
+    loan0 = entry["loan"]
+    if event == GIVE:
+        msg = loaner+" lent "+amount+" to "+loanee
+        if loan0.get("interest"):
+            msg += " @ "+str(loan0["interest"])+"% interest"
+        return msg
+    if event == EXTEND:
+        return loaner+" lent "+loanee+" another "+amount+", "+str(loan0["outstanding"])+" owed"
+    if event == REPAY:
+        if loan0 is None:
+            return loanee+" paid off their "+amount+" debt to "+loaner
+        return loanee+" repaid "+amount+" to "+loaner+", "+str(loan0["outstanding"])+" left"
+    if event == FORGIVE:
+        return loaner+" forgave "+loanee+"'s debt of "+amount
+    return event
@@ -0,0 +1,138 @@
+# Standard Library
+import heapq
+
+
+def settleable(loan0):
+    """Interest free loans can be netted, anything charging interest is left as it is."""
+    return loan0 is not None and not loan0.get("interest") and loan0["outstanding"] > 0
+
+
+class Settlement():
+    """A plan for replacing a guild's interest free loans with as few as it can.
+
+    `transfers` is {(loaner key, loanee key): amount} for the loans that
+    replace the `replaced` ones. Nobody ends up owed or owing a different
+    total, it's only who owes who that changes.
+    """
+
+    def __init__(self, replaced, transfers):
+        self.replaced = replaced
+        self.transfers = transfers
+
+    @property
+    def members(self):
+        return len({key for pair in self.replaced for key in pair})
+
+    @property
+    def amount(self):
+        return sum(self.transfers.values())
+
+    @property
+    def changes(self):
+        return self.replaced != self.transfers
+
+
+def plan(ledger):
+    """Works out how to settle a ledger's interest free loans, without changing it.
+
+    Opposite loans cancel and cycles (A owes B owes C owes A) collapse,
+    since only each member's net balance is kept: the biggest creditor is
+    paired with the biggest debtor until everyone's square, so a group of
+    n members never needs more than n-1 loans.
+
+    A pair that already has an interest bearing loan can't hold a second
+    one, so those pairings are skipped, or routed through a third member
+    when they're all that's left. If even that can't be done the plan
+    keeps the loans as they are.
+    """
+    replaced = {}
+    blocked = set()
+    net = {}
+    for loaner_key, loan_dict in ledger.items():
+        for loanee_key, loan0 in loan_dict.items():
+            if loan0 is None:
+                continue
+            if not settleable(loan0):
+                blocked.add((loaner_key, loanee_key))
+                continue
+            amount = loan0["outstanding"]
+            replaced[(loaner_key, loanee_key)] = amount
+            net[loaner_key] = net.get(loaner_key, 0) + amount
+            net[loanee_key] = net.get(loanee_key, 0) - amount
+
+    # max heaps of what each member is owed or owes, the key breaks ties so plans don't shuffle between runs
+    creditors = [(-amount, key) for key, amount in net.items() if amount > 0]
+    debtors = [(amount, key) for key, amount in net.items() if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = {}
+    members = sorted(net)
+    while creditors:
+        credit, creditor = heapq.heappop(creditors)
+        skipped = []
+        while debtors and (creditor, debtors[0][1]) in blocked:
+            skipped.append(heapq.heappop(debtors))
+        if debtors:
+            debt, debtor = heapq.heappop(debtors)
+            amount = min(-credit, -debt)
+            add_transfer(transfers, creditor, debtor, amount)
+        else:
+            # every debtor left already owes this creditor with interest, go through someone else
+            debt, debtor = heapq.heappop(skipped)
+            amount = min(-credit, -debt)
+            via = next((key for key in members if key not in (creditor, debtor) and (creditor, key) not in blocked and (key, debtor) not in blocked), None)
+            if via is None:
+                # nobody to go through, leave the loans as they are
+                return Settlement(replaced, dict(replaced))
+            add_transfer(transfers, creditor, via, amount)
+            add_transfer(transfers, via, debtor, amount)
+        for entry in skipped:
+            heapq.heappush(debtors, entry)
+        if credit + amount < 0:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if debt + amount < 0:
+            heapq.heappush(debtors, (debt + amount, debtor))
+
+    return Settlement(replaced, transfers)
+
+
+# Adds to a planned loan, cancelling against one planned the other way
+def add_transfer(transfers, loaner_key, loanee_key, amount):
+    reverse = transfers.pop((loanee_key, loaner_key), 0)
+    if reverse > amount:
+        transfers[(loanee_key, loaner_key)] = reverse - amount
+    elif amount > reverse:
+        transfers[(loaner_key, loanee_key)] = transfers.get((loaner_key, loanee_key), 0) + amount - reverse
+
+
+def apply(ledger, settlement, index=None):
+    """Swaps the settlement's replaced loans for its transfers, in place.
+
+    Loans the settlement leaves at the same amount aren't touched, so they
+    keep their original amount. Returns the (loaner key, loanee key) pairs
+    it removed and the loans it added.
+    """
+    replaced = settlement.replaced
+    transfers = settlement.transfers
+    removed = []
+    added = []
+    for (loaner_key, loanee_key), amount in replaced.items():
+        if transfers.get((loaner_key, loanee_key)) == amount:
+            continue
+        loan_dict = ledger.get(loaner_key, {})
+        loan_dict.pop(loanee_key, None)
+        if not loan_dict:
+            ledger.pop(loaner_key, None)
+        if index is not None:
+            index.discard(loaner_key, loanee_key)
+        removed.append((loaner_key, loanee_key))
+    for (loaner_key, loanee_key), amount in transfers.items():
+        if replaced.get((loaner_key, loanee_key)) == amount:
+            continue
+        loan0 = {"original_amount": amount, "outstanding": amount, "interest": None, "loaner": loaner_key, "loanee": loanee_key}
+        ledger.setdefault(loaner_key, {})[loanee_key] = loan0
+        if index is not None:
+            index.put(loan0)
+        added.append(loan0)
+    return removed, added